@@ -44,18 +44,28 @@
 # print("异常数据示例：")
 # print(df[(df['薪资'] < 0) | (df['薪资'] > 100000)].head(3))
 
+import os
+import sys
+import json
+import itertools
+import numpy as np
 import pandas as pd
 import chardet
+from 阶段结果缓存 import StageCache, CachedStagesMixin, cached_stage
 
 
-class SalaryAnalyzer:
-    def __init__(self, file_path):
+class SalaryAnalyzer(CachedStagesMixin):
+    def __init__(self, file_path, cache=None):
         # 自动检测文件编码
         self.encoding = self._detect_encoding(file_path)
-        # 使用检测到的编码读取文件
-        self.df = pd.read_csv(file_path, encoding=self.encoding, engine='python')
+        # 数据在首次使用时读取（缓存命中时无需解析）
+        self._init_stages(file_path, cache)
         self.invalid_records = pd.DataFrame()
 
+    def _read_df(self):
+        """使用检测到的编码读取文件"""
+        return pd.read_csv(self.file_path, encoding=self.encoding, engine='python')
+
     def _detect_encoding(self, file_path, sample_size=10000):
         """自动检测文件编码"""
         try:
@@ -68,6 +78,7 @@ class SalaryAnalyzer:
             print(f"编码检测失败：{e}，默认使用utf-8")
             return 'utf-8'
 
+    @cached_stage()
     def analyze_departments(self):
         """按部门统计薪资并标记异常"""
         # 按部门计算平均薪资和最高薪资
@@ -81,20 +92,354 @@ class SalaryAnalyzer:
         self.df['待审核'] = self.df['薪资'] > 2 * self.df['部门平均薪资']
         return self.df
 
+    def apply_history(self, history, month, z_threshold=3.0):
+        """结合历史分布标记异常，并用本月数据增量更新历史状态
+
+        待审核 = 超过本月部门平均2倍 或 超过历史均值 + z_threshold倍历史标准差；
+        month为薪资快照所属月份（如'2024-01'），历史分布只取该月之前的月份，
+        因此同一月份重跑、补录或乱序导入时标记结果都一致。
+        返回各部门本月与上一个已记录月份平均薪资的环比变化。
+        """
+        if '部门平均薪资' not in self.df.columns:
+            self.analyze_departments()
+        # 去掉上次调用留下的历史列，避免重复合并
+        self.df = self.df.drop(columns=['历史平均薪资', '历史薪资标准差', '历史异常'], errors='ignore')
+        self.df['待审核'] = self.df['薪资'] > 2 * self.df['部门平均薪资']
+
+        # 用该月之前的历史分布判断，避免本月数据影响自身的判断基准
+        hist = history.stats(before=month)
+        self.df = pd.merge(self.df, hist[['部门', '历史平均薪资', '历史薪资标准差']], on='部门', how='left')
+        self.df['历史异常'] = (
+            self.df['薪资'] > self.df['历史平均薪资'] + z_threshold * self.df['历史薪资标准差']
+        ).fillna(False)
+        self.df['待审核'] = self.df['待审核'] | self.df['历史异常']
+        return history.update(self.df, month)
+
+    def build_rollup(self, cube_path=None, dimensions=None, num_bins=256):
+        """一次扫描生成薪资汇总立方体（可选保存到cube_path）"""
+        cube = SalaryRollupCube.build(self.df, dimensions, num_bins)
+        if cube_path:
+            cube.save(cube_path)
+            print(f"汇总立方体已保存至：{cube_path}")
+        return cube
+
     def save_results(self, output_file):
         """保存结果"""
         self.df.to_csv(output_file, index=False, encoding='utf_8_sig')
         print(f"处理完成！结果已保存至：{output_file}")
 
 
+class SalaryHistory:
+    """各部门薪资的持久化增量统计（跨月份）
+
+    按月份保存各部门的人数、均值、离差平方和(M2)、最高薪资等可合并矩，
+    每月新快照只需扫描一次；任意月份之前的历史分布由更早月份的矩
+    用Chan/Welford公式合并得到（只涉及月数×部门数个小记录），数值稳定。
+    同一月份重复提交会覆盖该月的矩，重跑结果与首次一致。
+    """
+
+    CHANGE_COLUMNS = ['部门', '本月平均薪资', '上月平均薪资', '环比变化', '显著变化']
+
+    def __init__(self, state_path='salary_history.json', change_threshold=0.2):
+        self.state_path = state_path
+        self.change_threshold = change_threshold  # 环比变化超过该比例视为显著变化
+        self.state = {'months': {}}
+        if os.path.exists(state_path):
+            with open(state_path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+            if not isinstance(self.state.get('months'), dict):
+                raise ValueError(f"{state_path} 为旧格式（未按月保存统计量），请删除后按月份重新导入")
+
+    @staticmethod
+    def normalize_month(month):
+        """统一月份格式为'YYYY-MM'（非法月份抛出异常）"""
+        return str(pd.Period(month, freq='M'))
+
+    def has_month(self, month):
+        """该月份是否已计入历史统计"""
+        return self.normalize_month(month) in self.state['months']
+
+    @staticmethod
+    def _merge(total, part):
+        """Chan并行合并公式：将part的矩合并进total"""
+        n = total['count'] + part['count']
+        delta = part['mean'] - total['mean']
+        total['mean'] += delta * part['count'] / n
+        total['m2'] += part['m2'] + delta ** 2 * total['count'] * part['count'] / n
+        total['count'] = n
+        total['max'] = max(total['max'], part['max'])
+
+    def stats(self, before=None):
+        """历史统计（部门、历史人数、历史平均薪资、历史薪资标准差、历史最高薪资）
+
+        before指定月份时只统计该月之前的月份。
+        """
+        before = self.normalize_month(before) if before is not None else None
+        departments = {}
+        for month in sorted(self.state['months']):
+            if before is not None and month >= before:
+                break
+            for dept, part in self.state['months'][month].items():
+                if dept in departments:
+                    self._merge(departments[dept], part)
+                else:
+                    departments[dept] = dict(part)
+        rows = []
+        for dept, s in departments.items():
+            std = (s['m2'] / (s['count'] - 1)) ** 0.5 if s['count'] > 1 else np.nan
+            rows.append((dept, s['count'], s['mean'], std, s['max']))
+        return pd.DataFrame(
+            rows, columns=['部门', '历史人数', '历史平均薪资', '历史薪资标准差', '历史最高薪资']
+        ).astype({'历史人数': 'int64', '历史平均薪资': float, '历史薪资标准差': float, '历史最高薪资': float})
+
+    def update(self, df, month):
+        """记录一个月份的快照（同一月份重复提交时覆盖），返回与上一个已记录月份的环比变化"""
+        month = self.normalize_month(month)
+        # 本月各部门的矩（一次扫描）
+        batch = df.groupby('部门')['薪资'].agg(['count', 'mean', 'var', 'max'])
+        batch['m2'] = (batch['var'] * (batch['count'] - 1)).fillna(0)
+        self.state['months'][month] = {
+            str(dept): {'count': int(b['count']), 'mean': float(b['mean']),
+                        'm2': float(b['m2']), 'max': float(b['max'])}
+            for dept, b in batch.iterrows()
+        }
+
+        # 环比基准为该月之前最近一个有该部门数据的月份（补录、乱序导入时同样正确）
+        earlier = sorted((m for m in self.state['months'] if m < month), reverse=True)
+        changes = []
+        for dept, s in self.state['months'][month].items():
+            previous = next((self.state['months'][m][dept]['mean'] for m in earlier
+                             if dept in self.state['months'][m]), None)
+            change = (s['mean'] - previous) / abs(previous) if previous else np.nan
+            changes.append((dept, s['mean'], previous, change, bool(abs(change) > self.change_threshold)))
+
+        self._save()
+        return pd.DataFrame(changes, columns=self.CHANGE_COLUMNS)
+
+    def _save(self):
+        """原子写入状态文件"""
+        with open(self.state_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(self.state_path + '.tmp', self.state_path)
+
+
+class SalaryRollupCube:
+    """薪资多维汇总立方体
+
+    对维度的所有组合（grouping sets）预先计算可合并的聚合量：
+    人数、总和、平方和、最小值、最大值及分位数直方图，
+    查询任意切片时只需合并少量单元格，无需重新扫描员工数据。
+    维度编码为-1表示该维度已汇总（全部）。
+    """
+
+    DIMENSIONS = ['部门', '职级', '工作地点', '月份']
+    VALUE_COLUMN = '薪资'
+    ALL = '全部'
+
+    def __init__(self, dimensions, categories, codes, count, total, total_sq,
+                 minimum, maximum, hist, bin_edges):
+        self.dimensions = list(dimensions)
+        self.categories = [np.asarray(c, dtype=object) for c in categories]
+        self.codes = codes          # (单元格数, 维度数) int32
+        self.count = count
+        self.total = total
+        self.total_sq = total_sq
+        self.minimum = minimum
+        self.maximum = maximum
+        self.hist = hist            # (单元格数, 分箱数) 分位数直方图
+        self.bin_edges = bin_edges
+
+    @classmethod
+    def build(cls, df, dimensions=None, num_bins=256):
+        """一次扫描原始数据，计算所有维度组合的聚合量"""
+        dimensions = [d for d in (dimensions or cls.DIMENSIONS) if d in df.columns]
+        df = df[df[cls.VALUE_COLUMN].notna()]
+        values = df[cls.VALUE_COLUMN].to_numpy(dtype=float)
+
+        # 维度编码
+        categories, columns = [], []
+        for dim in dimensions:
+            codes, uniques = pd.factorize(df[dim].astype(str))
+            columns.append(codes)
+            categories.append(uniques)
+        row_codes = np.column_stack(columns).astype(np.int32) if columns \
+            else np.zeros((len(values), 0), dtype=np.int32)
+
+        # 全局等频分箱作为分位数草图（各单元格共用分箱边界，因此可直接相加合并）
+        if len(values):
+            bin_edges = np.unique(np.quantile(values, np.linspace(0, 1, num_bins + 1)))
+        else:
+            bin_edges = np.array([0.0, 1.0])
+        if len(bin_edges) < 2:
+            bin_edges = np.array([bin_edges[0], bin_edges[0]])
+        bins = np.clip(np.searchsorted(bin_edges, values, side='right') - 1, 0, len(bin_edges) - 2)
+
+        # 最细粒度单元格聚合（唯一一次扫描原始行，多维编码压缩为单个整数键）
+        shape = [max(len(c), 1) for c in categories]
+        flat = np.ravel_multi_index(row_codes.T, shape) if dimensions else np.zeros(len(values), dtype=np.int64)
+        cells, inverse = np.unique(flat, return_inverse=True)
+        cell_codes = np.column_stack(np.unravel_index(cells, shape)).astype(np.int32) if dimensions \
+            else np.zeros((len(cells), 0), dtype=np.int32)
+        finest = cls._aggregate(
+            inverse.ravel(), len(cell_codes), np.ones(len(values), dtype=np.int64),
+            values, values ** 2, values, values, bins, len(bin_edges) - 1
+        )
+
+        # 由最细粒度单元格合并出其余所有维度组合
+        parts = []
+        for keep in itertools.product([True, False], repeat=len(dimensions)):
+            codes = cell_codes.copy()
+            codes[:, ~np.array(keep, dtype=bool)] = -1
+            group_codes, group_inverse = np.unique(codes, axis=0, return_inverse=True)
+            parts.append((group_codes, cls._merge(group_inverse.ravel(), len(group_codes), finest)))
+
+        return cls(
+            dimensions, categories,
+            np.concatenate([p[0] for p in parts]),
+            *[np.concatenate([p[1][i] for p in parts]) for i in range(6)],
+            bin_edges
+        )
+
+    @staticmethod
+    def _aggregate(groups, n_groups, count, total, total_sq, minimum, maximum, bins, n_bins):
+        """按组号聚合（count/total/total_sq为逐行量，bins为逐行分箱号）"""
+        group_min = np.full(n_groups, np.inf)
+        group_max = np.full(n_groups, -np.inf)
+        np.minimum.at(group_min, groups, minimum)
+        np.maximum.at(group_max, groups, maximum)
+        hist = np.bincount(
+            groups.astype(np.int64) * n_bins + bins, minlength=n_groups * n_bins
+        ).reshape(n_groups, n_bins).astype(np.uint32)
+        return (
+            np.bincount(groups, weights=count, minlength=n_groups).astype(np.int64),
+            np.bincount(groups, weights=total, minlength=n_groups),
+            np.bincount(groups, weights=total_sq, minlength=n_groups),
+            group_min, group_max, hist
+        )
+
+    @staticmethod
+    def _merge(groups, n_groups, stats):
+        """合并单元格的聚合量"""
+        count, total, total_sq, minimum, maximum, hist = stats
+        merged_min = np.full(n_groups, np.inf)
+        merged_max = np.full(n_groups, -np.inf)
+        np.minimum.at(merged_min, groups, minimum)
+        np.maximum.at(merged_max, groups, maximum)
+        merged_hist = np.zeros((n_groups, hist.shape[1]), dtype=np.uint32)
+        np.add.at(merged_hist, groups, hist)
+        return (
+            np.bincount(groups, weights=count, minlength=n_groups).astype(np.int64),
+            np.bincount(groups, weights=total, minlength=n_groups),
+            np.bincount(groups, weights=total_sq, minlength=n_groups),
+            merged_min, merged_max, merged_hist
+        )
+
+    def save(self, path):
+        """以压缩的npz格式保存立方体"""
+        np.savez_compressed(
+            path,
+            dimensions=np.array(self.dimensions, dtype=str),
+            **{f'categories_{i}': np.array(c, dtype=str) for i, c in enumerate(self.categories)},
+            codes=self.codes, count=self.count, total=self.total, total_sq=self.total_sq,
+            minimum=self.minimum, maximum=self.maximum, hist=self.hist, bin_edges=self.bin_edges
+        )
+
+    @classmethod
+    def load(cls, path):
+        """加载已保存的立方体"""
+        with np.load(path) as data:
+            dimensions = data['dimensions'].tolist()
+            categories = [data[f'categories_{i}'] for i in range(len(dimensions))]
+            return cls(
+                dimensions, categories, data['codes'],
+                data['count'], data['total'], data['total_sq'],
+                data['minimum'], data['maximum'], data['hist'], data['bin_edges']
+            )
+
+    def query(self, by=None, quantiles=(0.5, 0.9), **filters):
+        """查询任意切片
+
+        by：结果中保留的维度（如['部门', '月份']），不指定时返回总体一行；
+        filters：维度筛选条件，值可以是单个取值或取值列表，如 部门='技术部'。
+        """
+        by = list(by or [])
+        unknown = [d for d in by + list(filters) if d not in self.dimensions]
+        if unknown:
+            raise KeyError(f"立方体中不存在维度：{unknown}")
+
+        # 筛选维度取具体值的单元格，其余维度取汇总单元格，再按by合并
+        mask = np.ones(len(self.codes), dtype=bool)
+        for i, dim in enumerate(self.dimensions):
+            if dim in filters:
+                wanted = filters[dim]
+                wanted = [wanted] if isinstance(wanted, str) or np.isscalar(wanted) else wanted
+                wanted_codes = np.flatnonzero(np.isin(self.categories[i], [str(w) for w in wanted]))
+                mask &= np.isin(self.codes[:, i], wanted_codes)
+            elif dim in by:
+                mask &= self.codes[:, i] >= 0
+            else:
+                mask &= self.codes[:, i] == -1
+
+        by_idx = [self.dimensions.index(d) for d in by]
+        cells = np.flatnonzero(mask)
+        if by_idx:
+            group_codes, groups = np.unique(self.codes[np.ix_(cells, by_idx)], axis=0, return_inverse=True)
+            groups = groups.ravel()
+        else:
+            group_codes, groups = np.zeros((1, 0), dtype=np.int32), np.zeros(len(cells), dtype=np.int64)
+        n_groups = len(group_codes)
+        count, total, total_sq, minimum, maximum, hist = self._merge(groups, n_groups, (
+            self.count[cells], self.total[cells], self.total_sq[cells],
+            self.minimum[cells], self.maximum[cells], self.hist[cells]
+        ))
+
+        result = pd.DataFrame({
+            dim: self.categories[i][group_codes[:, j]] for j, (dim, i) in enumerate(zip(by, by_idx))
+        })
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / count
+            variance = np.maximum(total_sq / count - mean ** 2, 0) * count / np.maximum(count - 1, 1)
+        result['人数'] = count
+        result['平均薪资'] = mean
+        result['薪资标准差'] = np.sqrt(variance)
+        result['最低薪资'] = np.where(count > 0, minimum, np.nan)
+        result['最高薪资'] = np.where(count > 0, maximum, np.nan)
+        for q in quantiles:
+            result[f'P{q * 100:g}'] = self._quantile(hist, q, minimum, maximum)
+        return result
+
+    def _quantile(self, hist, q, minimum, maximum):
+        """由直方图估算分位数（分箱内线性插值，并限制在[最小值, 最大值]内）"""
+        cumulative = np.cumsum(hist, axis=1, dtype=np.int64)
+        total = cumulative[:, -1]
+        target = q * total
+        idx = np.minimum((cumulative < target[:, None]).sum(axis=1), hist.shape[1] - 1)
+        rows = np.arange(len(hist))
+        before = np.where(idx > 0, cumulative[rows, idx - 1], 0)
+        in_bin = np.maximum(hist[rows, idx], 1)
+        lo, hi = self.bin_edges[idx], self.bin_edges[idx + 1]
+        estimate = lo + (hi - lo) * np.clip((target - before) / in_bin, 0, 1)
+        return np.where(total > 0, np.clip(estimate, minimum, maximum), np.nan)
+
+
 if __name__ == "__main__":
     try:
         # 实例化分析器
-        analyzer = SalaryAnalyzer('salary_data.csv')
+        analyzer = SalaryAnalyzer('salary_data.csv', cache=StageCache())
 
         # 执行分析
         result_df = analyzer.analyze_departments()
 
+        # 结合历史分布标记异常，并增量更新历史统计（月份为薪资快照所属月份，由命令行指定）
+        if len(sys.argv) > 1:
+            history = SalaryHistory('salary_history.json')
+            changes = analyzer.apply_history(history, month=sys.argv[1])
+            result_df = analyzer.df
+            print("\n部门平均薪资环比：")
+            print(changes)
+        else:
+            print("未指定薪资月份（用法：python 员工薪资数据聚合.py 2024-01），跳过历史对比")
+
         # 保存结果
         analyzer.save_results('salary_analysis.csv')
 
@@ -104,5 +449,10 @@ if __name__ == "__main__":
 
         print("\n待审核异常记录：")
         print(result_df[result_df['待审核']][['员工ID', '部门', '薪资', '部门平均薪资']])
+
+        # 生成汇总立方体，后续切片查询直接读取立方体
+        cube = analyzer.build_rollup('salary_cube.npz')
+        print("\n汇总立方体查询（按部门）：")
+        print(cube.query(by=['部门']))
     except Exception as e:
         print(f"运行失败：{str(e)}")
\ No newline at end of file
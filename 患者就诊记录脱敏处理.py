@@ -45,21 +45,37 @@
 # print(df[df['诊断结果'].isin(sensitive_diseases)].head(3))
 
 
+import os
+import csv
+import codecs
+import shutil
 import pandas as pd
 import re
 import json
 import chardet
+from array import array
 from datetime import datetime
 from faker import Faker
+from 阶段结果缓存 import CachedStagesMixin
 
 
-class PatientAnonymizer:
+class PatientAnonymizer(CachedStagesMixin):
     def __init__(self, file_path, sensitive_map_path='sensitive_mapping.json'):
-        # 自动检测编码并读取文件（保留原始数据副本）
+        # 自动检测编码（不保留原始数据副本，只记录每行的字节偏移）
         self.encoding = self._detect_encoding(file_path)
-        self.original_df = pd.read_csv(file_path, encoding=self.encoding, engine='python')
-        self.df = self.original_df.copy()
+        self.row_offsets = self._index_row_offsets(file_path)
+        # 数据在首次使用时读取（分块处理时不整体读入）
+        self._init_stages(file_path)
         self.name_mapping = {}  # 存储姓名映射关系
+        self.faker = Faker('zh_CN')
+
+    def _read_df(self):
+        """使用检测到的编码读取文件
+
+        所有列按字符串读取：身份证号列若含空值会被推断为float64（有效号码变成科学计数法），
+        且推断结果依赖读入的数据范围，分块读取时会因块边界不同而不一致。
+        """
+        return pd.read_csv(self.file_path, encoding=self.encoding, engine='python', dtype=str)
 
     def _detect_encoding(self, file_path, sample_size=10000):
         """自动检测文件编码"""
@@ -72,6 +88,59 @@ class PatientAnonymizer:
             print(f"编码检测失败：{e}，默认使用utf-8")
             return 'utf-8'
 
+    def _index_row_offsets(self, file_path):
+        """记录每条记录的起始字节偏移（末尾附加文件结束位置）
+
+        第i条记录对应 offsets[i] 到 offsets[i+1] 之间的原始字节，offsets[0] 之前为表头。
+        用csv模块（即pandas python引擎所用的解析器）逐行解析字节流，
+        记录切分、引号处理和空行跳过都与 pd.read_csv(engine='python') 一致。
+        """
+        offsets = array('q')
+        pos = 0
+        decoder = codecs.getincrementaldecoder(self.encoding)()
+
+        def _lines(f):
+            nonlocal pos
+            for line in f:
+                pos += len(line)
+                yield decoder.decode(line)
+
+        with open(file_path, 'rb') as f:
+            reader = csv.reader(_lines(f))
+            record_start = 0
+            for row in reader:
+                # 与pandas的skip_blank_lines一致：空行和只含空白的单字段行不计为记录
+                if row and (len(row) > 1 or row[0].strip()):
+                    offsets.append(record_start)
+                record_start = pos
+        if len(offsets):
+            offsets.pop(0)  # 第一条为表头
+        offsets.append(pos)
+        return offsets
+
+    def _check_row_offsets(self, num_rows):
+        """确认偏移索引与pandas解析出的记录数一致，不一致时拒绝按偏移复制原始行"""
+        if len(self.row_offsets) - 1 != num_rows:
+            raise ValueError(
+                f"原始行索引与解析结果不一致（索引{len(self.row_offsets) - 1}条，解析{num_rows}条），"
+                f"无法保证原始记录与源文件一致")
+
+    def _copy_original_rows(self, row_positions, output_file, with_header=True):
+        """按字节偏移从源文件复制原始行，与源文件逐字节一致"""
+        with open(self.file_path, 'rb') as src, open(output_file, 'wb') as dst:
+            header = src.read(self.row_offsets[0])
+            if with_header:
+                dst.write(header)
+            newline = b'\r\n' if header.endswith(b'\r\n') else b'\n'
+            for i in row_positions:
+                start, end = self.row_offsets[i], self.row_offsets[i + 1]
+                src.seek(start)
+                line = src.read(end - start)
+                # 去掉记录后被跳过的空行；源文件最后一行可能没有换行符
+                body = line.rstrip(b'\r\n')
+                rest = line[len(body):]
+                dst.write(body + (rest[:rest.index(b'\n') + 1] if b'\n' in rest else newline))
+
     def _validate_birthdate(self, year, month, day):
         """验证出生日期合法性"""
         try:
@@ -118,7 +187,7 @@ class PatientAnonymizer:
         unique_names = self.df['姓名'].unique()
         for name in unique_names:
             if name not in self.name_mapping:
-                self.name_mapping[name] = Faker('zh_CN').name()
+                self.name_mapping[name] = self.faker.name()
         self.df['姓名'] = self.df['姓名'].map(self.name_mapping)
         return self.df
 
@@ -148,6 +217,7 @@ class PatientAnonymizer:
 
     def save_results(self, valid_output, invalid_output, invalid_original_output, mapping_output):
         """保存结果（有效记录、脱敏无效记录、原始无效记录、映射表）"""
+        self._check_row_offsets(len(self.df))
         # 分离有效/无效记录
         valid_df = self.df[self.df['是否有效'] == True].drop(columns=['是否有效'])
         invalid_df = self.df[self.df['是否有效'] == False].drop(columns=['是否有效'])
@@ -158,9 +228,9 @@ class PatientAnonymizer:
         # 保存脱敏后的无效记录
         invalid_df.to_csv(invalid_output, index=False, encoding=self.encoding)
 
-        # 保存原始无效记录（从未脱敏的原始数据中提取）
+        # 保存原始无效记录（按字节偏移直接从源文件复制未脱敏的原始行）
         invalid_indices = self.df[self.df['是否有效'] == False].index
-        self.original_df.loc[invalid_indices].to_csv(invalid_original_output, index=False, encoding=self.encoding)
+        self._copy_original_rows(invalid_indices, invalid_original_output)
 
         # 保存姓名映射表
         pd.DataFrame({
@@ -173,6 +243,142 @@ class PatientAnonymizer:
         print(f"原始无效记录：{len(invalid_indices)}条 → {invalid_original_output}")
         print(f"姓名映射表 → {mapping_output}")
 
+    def run_chunked(self, valid_output, invalid_output, invalid_original_output, mapping_output,
+                    checkpoint_dir='anonymize_checkpoint', chunk_size=100000, seed=42):
+        """分块脱敏并保存断点，中断后重新调用即从最近的断点继续
+
+        每块处理完后，先原子写入该块的分片输出和新增的姓名映射分片并落盘，
+        再原子更新断点（只记已处理行数、块数和统计数，大小与数据量无关）；
+        续跑时按块号重新加载姓名映射分片。每块的虚拟姓名由seed和块号确定，
+        因此断点续跑与一次跑完的输出完全一致。全部完成后合并分片并删除断点目录。
+        """
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        checkpoint_path = os.path.join(checkpoint_dir, 'checkpoint.json')
+        total_rows = len(self.row_offsets) - 1
+        source = {'input': os.path.abspath(self.file_path), 'input_size': os.path.getsize(self.file_path),
+                  'chunk_size': chunk_size, 'seed': seed}
+        state = {'rows_done': 0, 'chunks_done': 0, 'valid': 0, 'invalid': 0, 'columns': None}
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved.get('source') == source:
+                state = saved['state']
+                print(f"从断点继续：已处理{state['rows_done']}/{total_rows}条")
+            else:
+                print("断点与当前输入或参数不一致，重新开始")
+
+        # 分片不带BOM和表头，合并时统一写入
+        part_encoding = 'utf-8' if codecs.lookup(self.encoding).name == 'utf-8-sig' else self.encoding
+        mapping_columns = ['原始姓名', '虚拟姓名']
+        self.name_mapping = {}
+        for i in range(state['chunks_done']):
+            mapping_part = pd.read_csv(os.path.join(checkpoint_dir, f"part_{i:06d}_mapping.csv"),
+                                       encoding=part_encoding, header=None, names=mapping_columns, dtype=str)
+            self.name_mapping.update(zip(mapping_part['原始姓名'], mapping_part['虚拟姓名']))
+        columns = pd.read_csv(self.file_path, encoding=self.encoding, engine='python', nrows=0).columns
+        with open(self.file_path, 'rb') as src:
+            while True:
+                start = state['rows_done']
+                src.seek(self.row_offsets[start])
+                self.df = pd.read_csv(src, encoding=part_encoding, engine='python', header=None,
+                                      names=columns, nrows=chunk_size, dtype=str)
+                # 以读到文件末尾（空块）结束，不依赖偏移索引的记录数
+                if self.df.empty:
+                    break
+                if start + len(self.df) > total_rows:
+                    self._check_row_offsets(start + len(self.df))  # 解析出的记录多于索引，立即报错
+                self.df.index = range(start, start + len(self.df))
+
+                self.faker.seed_instance(seed * 1000003 + state['chunks_done'])
+                new_names = [name for name in self.df['姓名'].unique() if name not in self.name_mapping]
+                self.anonymize_names()
+                self.mask_id_numbers()
+                self.blur_diagnosis()
+
+                valid_mask = self.df['是否有效'] == True
+                invalid_mask = self.df['是否有效'] == False
+                output = self.df.drop(columns=['是否有效'])
+                part = os.path.join(checkpoint_dir, f"part_{state['chunks_done']:06d}")
+                self._atomic_write(part + '_valid.csv', lambda p: output[valid_mask].to_csv(
+                    p, index=False, header=False, encoding=part_encoding))
+                self._atomic_write(part + '_invalid.csv', lambda p: output[invalid_mask].to_csv(
+                    p, index=False, header=False, encoding=part_encoding))
+                self._atomic_write(part + '_invalid_original.csv', lambda p: self._copy_original_rows(
+                    self.df.index[invalid_mask], p, with_header=False))
+                self._atomic_write(part + '_mapping.csv', lambda p: pd.DataFrame({
+                    '原始姓名': new_names,
+                    '虚拟姓名': [self.name_mapping[name] for name in new_names]
+                }).to_csv(p, index=False, header=False, encoding=part_encoding))
+
+                state.update(rows_done=start + len(self.df), chunks_done=state['chunks_done'] + 1,
+                             valid=state['valid'] + int(valid_mask.sum()),
+                             invalid=state['invalid'] + int(invalid_mask.sum()),
+                             columns=list(output.columns))
+                self._atomic_write(checkpoint_path, lambda p: self._dump_json({'source': source, 'state': state}, p))
+                print(f"已处理：{state['rows_done']}/{total_rows}条")
+
+        # 实际解析的记录数必须与偏移索引一致，否则原始无效记录可能复制错行
+        self._check_row_offsets(state['rows_done'])
+
+        # 合并分片为最终输出
+        out_columns = state['columns'] or [c for c in columns]
+        header = pd.DataFrame(columns=out_columns).to_csv(index=False)
+        mapping_header = pd.DataFrame(columns=mapping_columns).to_csv(index=False)
+        for suffix, output_file, header_text in [
+            ('_valid.csv', valid_output, header),
+            ('_invalid.csv', invalid_output, header),
+            ('_invalid_original.csv', invalid_original_output, None),
+            ('_mapping.csv', mapping_output, mapping_header),
+        ]:
+            def _merge(p):
+                with open(p, 'wb') as dst:
+                    if header_text is None:
+                        with open(self.file_path, 'rb') as src:
+                            dst.write(src.read(self.row_offsets[0]))
+                    else:
+                        dst.write(header_text.encode(self.encoding))
+                    for i in range(state['chunks_done']):
+                        with open(os.path.join(checkpoint_dir, f"part_{i:06d}{suffix}"), 'rb') as part_file:
+                            shutil.copyfileobj(part_file, dst, 8 * 1024 * 1024)
+            self._atomic_write(output_file, _merge)
+
+        # 只删除本次运行创建的断点和分片文件，目录为空时才删除目录
+        suffixes = ('_valid.csv', '_invalid.csv', '_invalid_original.csv', '_mapping.csv')
+        for i in range(state['chunks_done']):
+            for suffix in suffixes:
+                os.remove(os.path.join(checkpoint_dir, f"part_{i:06d}{suffix}"))
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        if not os.listdir(checkpoint_dir):
+            os.rmdir(checkpoint_dir)
+
+        print(f"有效记录：{state['valid']}条 → {valid_output}")
+        print(f"脱敏无效记录：{state['invalid']}条 → {invalid_output}")
+        print(f"原始无效记录：{state['invalid']}条 → {invalid_original_output}")
+        print(f"姓名映射表 → {mapping_output}")
+
+    @staticmethod
+    def _atomic_write(path, write):
+        """先写临时文件并落盘，再原子替换并落盘所在目录
+
+        断电后不会留下半个文件，也不会出现断点已提交而它引用的分片还没落盘的情况。
+        """
+        write(path + '.tmp')
+        with open(path + '.tmp', 'rb+') as f:
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+        if os.name != 'nt':  # Windows不支持对目录fsync
+            dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    @staticmethod
+    def _dump_json(data, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
 if __name__ == "__main__":
     try:
         anonymizer = PatientAnonymizer('patient_records.csv')
@@ -195,7 +401,7 @@ if __name__ == "__main__":
         print(pd.read_csv('invalid_patients.csv', encoding=anonymizer.encoding).head(2))
 
         # 打印处理前后对比
-        original = pd.read_csv('patient_records.csv', encoding=anonymizer._detect_encoding('patient_records.csv'))
+        original = pd.read_csv('patient_records.csv', encoding=anonymizer.encoding, engine='python', nrows=2)
         print("\n处理前后对比示例：")
         for i in range(2):
             print(
@@ -1,19 +1,119 @@
 import os
+import csv
+import mmap
 import shutil
+import hashlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 # 定义源文件夹和整理文件夹路径
 source_folder = 'e:\\python数据分析案例'
 organize_folder = os.path.join(source_folder, '整理')
 
+# 重复文件处理方式：'hardlink' 以硬链接代替副本，'skip' 直接跳过
+dedup_mode = 'hardlink'
+# 哈希计算参数
+partial_block_size = 64 * 1024       # 部分哈希读取首尾各64KB
+full_read_size = 8 * 1024 * 1024     # 完整哈希的缓冲读取大小
+hash_workers = 8                     # 哈希线程数
+
+
+def partial_hash(path, size):
+    """读取文件首尾块计算部分哈希（小文件等同于完整哈希）"""
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        digest.update(f.read(partial_block_size))
+        if size > 2 * partial_block_size:
+            f.seek(-partial_block_size, os.SEEK_END)
+            digest.update(f.read(partial_block_size))
+        elif size > partial_block_size:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def full_hash(path):
+    """计算完整文件哈希（优先mmap，失败时退回大缓冲区读取）"""
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                for offset in range(0, len(m), full_read_size):
+                    digest.update(m[offset:offset + full_read_size])
+        except (ValueError, OSError):
+            f.seek(0)
+            for block in iter(lambda: f.read(full_read_size), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def split_groups(groups, key_func, executor):
+    """按键函数细分每个候选组，只保留多于一个文件的组
+
+    所有组的文件一次性提交给线程池，大量2~3个文件的小组也能占满全部线程。
+    """
+    items = [(index, path) for index, group in enumerate(groups) for path in group]
+    split = defaultdict(list)
+    for (index, path), key in zip(items, executor.map(key_func, [path for _, path in items])):
+        split[(index, key)].append(path)
+    return [group for group in split.values() if len(group) > 1]
+
+
+def find_duplicates(paths):
+    """查找内容完全相同的文件：先按大小分组，再按首尾块哈希，最后才做完整哈希
+
+    返回 {重复文件路径: 保留的原始文件路径}，每组中顺序最靠前的文件作为原始文件。
+    """
+    sizes = {path: os.path.getsize(path) for path in paths}
+    by_size = defaultdict(list)
+    for path in paths:
+        by_size[sizes[path]].append(path)
+    candidates = [group for size, group in by_size.items() if len(group) > 1 and size > 0]
+    same_content = [group for size, group in by_size.items() if len(group) > 1 and size == 0]
+
+    with ThreadPoolExecutor(max_workers=hash_workers) as executor:
+        partial_groups = split_groups(candidates, lambda p: partial_hash(p, sizes[p]), executor)
+        # 首尾块已覆盖全部内容的小文件无需再做完整哈希
+        same_content += [g for g in partial_groups if sizes[g[0]] <= 2 * partial_block_size]
+        same_content += split_groups([g for g in partial_groups if sizes[g[0]] > 2 * partial_block_size],
+                                     full_hash, executor)
+
+    duplicates = {}
+    for group_paths in same_content:
+        original = group_paths[0]
+        for path in group_paths[1:]:
+            duplicates[path] = original
+    return duplicates
+
+
 # 创建整理文件夹（如果不存在）
 if not os.path.exists(organize_folder):
     os.makedirs(organize_folder)
 
-# 首先复制所有文件到整理文件夹
-for item in os.listdir(source_folder):
-    item_path = os.path.join(source_folder, item)
-    if os.path.isfile(item_path):  # 只复制文件，不处理子文件夹
-        shutil.copy2(item_path, organize_folder)
+# 只处理文件，不处理子文件夹
+source_files = [os.path.join(source_folder, item) for item in os.listdir(source_folder)]
+source_files = [path for path in source_files if os.path.isfile(path)]
+
+# 查找重复文件（大多数文件仅凭大小或首尾块即可排除，无需完整读取）
+duplicates = find_duplicates(source_files)
+
+# 首先复制所有文件到整理文件夹（重复文件按dedup_mode处理）
+report = []
+for item_path in source_files:
+    if item_path in duplicates:
+        original = duplicates[item_path]
+        target = os.path.join(organize_folder, os.path.basename(item_path))
+        action = '跳过'
+        if dedup_mode == 'hardlink':
+            try:
+                os.link(os.path.join(organize_folder, os.path.basename(original)), target)
+                action = '硬链接'
+            except OSError as e:
+                print(f"硬链接失败：{e}，改为复制")
+                shutil.copy2(item_path, organize_folder)
+                action = '复制'
+        report.append((item_path, original, os.path.getsize(item_path), action))
+        continue
+    shutil.copy2(item_path, organize_folder)
 
 # 然后对整理文件夹中的文件进行分类
 for root, dirs, files in os.walk(organize_folder):
@@ -31,4 +131,14 @@ for root, dirs, files in os.walk(organize_folder):
         # 移动文件到对应的扩展名文件夹
         shutil.move(file_path, os.path.join(ext_folder, file))
 
-print("文件复制并整理完成！")
\ No newline at end of file
+# 输出重复文件报告（分类完成后再写入，避免报告本身被归类）
+if report:
+    report_path = os.path.join(organize_folder, '重复文件报告.csv')
+    with open(report_path, 'w', newline='', encoding='utf_8_sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(['重复文件', '原始文件', '大小(字节)', '处理方式'])
+        writer.writerows(report)
+    saved = sum(size for _, _, size, _ in report)
+    print(f"发现重复文件：{len(report)}个，节省空间：{saved / 1024 / 1024:.2f}MB → {report_path}")
+
+print("文件复制并整理完成！")
@@ -0,0 +1,317 @@
+"""
+各分析脚本的模拟数据生成器（向量化 + 分块写盘）
+
+每个数据集一个生成函数，均支持：
+1. seed：相同种子与分块大小生成相同数据（每块使用独立的随机流）；
+2. chunk_size：按块生成并追加写入CSV，内存占用与总行数无关，可生成1e8+行；
+3. 异常比例参数：控制异常/脏数据的占比。
+"""
+import numpy as np
+import pandas as pd
+
+
+def _write_chunks(path, num_rows, make_chunk, seed=42, chunk_size=1_000_000, encoding='utf_8_sig'):
+    """分块生成并写入CSV
+
+    make_chunk(rng, start, size) 返回第 start 行起的 size 行数据。
+    """
+    for chunk_index, start in enumerate(range(0, num_rows, chunk_size)):
+        size = min(chunk_size, num_rows - start)
+        rng = np.random.default_rng([seed, chunk_index])
+        chunk = make_chunk(rng, start, size)
+        first = chunk_index == 0
+        # BOM只在文件开头写一次
+        chunk_encoding = encoding if first or encoding != 'utf_8_sig' else 'utf-8'
+        chunk.to_csv(path, mode='w' if first else 'a', header=first, index=False, encoding=chunk_encoding)
+    print(f"测试数据已生成：{path}（共{num_rows}条）")
+    return path
+
+
+def _row_ids(prefix, start, size, width):
+    """生成带前缀的编号，如 EMP0001"""
+    ids = pd.Series(np.arange(start + 1, start + size + 1)).astype(str).str.zfill(width)
+    return prefix + ids
+
+
+def _labels(prefix, count, width):
+    """预先生成编号1..count的标签表（下标0占位），按编码取值避免逐行格式化"""
+    return (prefix + pd.Series(np.arange(count + 1)).astype(str).str.zfill(width)).to_numpy()
+
+
+def _random_digits(rng, size, width):
+    """生成定长数字串"""
+    return pd.Series(rng.integers(0, 10 ** width, size)).astype(str).str.zfill(width)
+
+
+def _pick(rng, options, size):
+    """从候选值中随机选取（候选值可包含None）"""
+    return np.asarray(options, dtype=object)[rng.integers(0, len(options), size)]
+
+
+# ---------------- 员工薪资 ----------------
+SALARY_RANGES = {
+    "技术部": (15000, 80000),
+    "市场部": (8000, 50000),
+    "财务部": (10000, 60000),
+    "人力资源部": (6000, 40000),
+    "行政部": (5000, 30000)
+}
+
+
+def generate_salary_data(path='salary_data.csv', num_rows=300, seed=42, anomaly_ratio=0.2,
+                         chunk_size=1_000_000):
+    """员工薪资数据（异常值为负薪资或超高薪资）"""
+    departments = np.array(list(SALARY_RANGES))
+    lows = np.array([r[0] for r in SALARY_RANGES.values()])
+    highs = np.array([r[1] for r in SALARY_RANGES.values()])
+
+    def make_chunk(rng, start, size):
+        dept = rng.integers(0, len(departments), size)
+        salary = rng.integers(lows[dept], highs[dept])
+        anomaly = rng.random(size) < anomaly_ratio
+        negative = rng.random(size) < 0.5
+        salary = np.where(anomaly & negative, -rng.integers(0, 10000, size), salary)
+        salary = np.where(anomaly & ~negative, highs[dept] * 2 + rng.integers(0, 100000, size), salary)
+        return pd.DataFrame({
+            "员工ID": _row_ids('EMP', start, size, 4),
+            "姓名": '员工' + pd.Series(np.arange(start + 1, start + size + 1)).astype(str),
+            "部门": departments[dept],
+            "薪资": salary
+        })
+
+    return _write_chunks(path, num_rows, make_chunk, seed, chunk_size)
+
+
+# ---------------- 患者就诊记录 ----------------
+SURNAMES = list("王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹")
+GIVEN_CHARS = list("伟芳娜秀英敏静丽强磊军洋勇艳杰娟涛明超秀兰霞平刚桂英华玉萍红娥玲芬燕")
+REGION_CODES = [110101, 310104, 440103, 510104, 330106, 320102, 420102, 610103]
+SENSITIVE_DISEASES = ["癌症", "艾滋病", "梅毒", "乙肝"]
+NORMAL_DISEASES = ["感冒", "高血压", "糖尿病", "胃炎"]
+ID_FACTORS = np.array([7, 9, 10, 5, 8, 4, 2, 1, 6, 3, 7, 9, 10, 5, 8, 4, 2])
+ID_CHECK_CODES = np.array(list('10X98765432'))
+
+
+def _id_numbers(rng, size, invalid_ratio):
+    """生成身份证号（校验码向量化计算，invalid_ratio比例为错误校验码或位数不足）"""
+    birth = np.datetime64('1940-01-01') + rng.integers(0, 65 * 365, size).astype('timedelta64[D]')
+    year = birth.astype('datetime64[Y]').astype(int) + 1970
+    month = birth.astype('datetime64[M]').astype(int) % 12 + 1
+    day = (birth - birth.astype('datetime64[M]')).astype(int) + 1
+    region = np.asarray(REGION_CODES)[rng.integers(0, len(REGION_CODES), size)]
+    body = (region.astype(np.int64) * 10 ** 11 + (year * 10000 + month * 100 + day) * 1000
+            + rng.integers(0, 1000, size))
+    digits = (body[:, None] // 10 ** np.arange(16, -1, -1, dtype=np.int64)) % 10
+    check = (digits @ ID_FACTORS) % 11
+
+    invalid = rng.random(size) < invalid_ratio
+    truncated = invalid & (rng.random(size) < 0.3)
+    check = np.where(invalid & ~truncated, (check + 1 + rng.integers(0, 10, size)) % 11, check)
+    ids = pd.Series(body).astype(str).str.zfill(17) + ID_CHECK_CODES[check]
+    return ids.where(~truncated, ids.str[:15])
+
+
+def generate_patient_data(path='patient_records.csv', num_rows=200, seed=42, sensitive_ratio=0.2,
+                          invalid_id_ratio=0.1, chunk_size=1_000_000):
+    """患者就诊记录（含敏感诊断和无效身份证号）"""
+
+    def make_chunk(rng, start, size):
+        surnames = np.asarray(SURNAMES)[rng.integers(0, len(SURNAMES), size)]
+        given = np.asarray(GIVEN_CHARS)
+        first = given[rng.integers(0, len(given), size)]
+        second = np.where(rng.random(size) < 0.6, given[rng.integers(0, len(given), size)], '')
+        diagnosis = np.where(
+            rng.random(size) < sensitive_ratio,
+            np.asarray(SENSITIVE_DISEASES)[rng.integers(0, len(SENSITIVE_DISEASES), size)],
+            np.asarray(NORMAL_DISEASES)[rng.integers(0, len(NORMAL_DISEASES), size)]
+        )
+        visit_time = pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 2 * 365 * 86400, size), unit='s')
+        return pd.DataFrame({
+            "姓名": np.char.add(np.char.add(surnames, first), second),
+            "身份证号": _id_numbers(rng, size, invalid_id_ratio),
+            "诊断结果": diagnosis,
+            "就诊时间": visit_time.strftime("%Y-%m-%d %H:%M:%S")
+        })
+
+    return _write_chunks(path, num_rows, make_chunk, seed, chunk_size)
+
+
+# ---------------- 物流运单 ----------------
+INVALID_WAYBILLS = ['A12345678901', '123456', '1234567890123', '12345 678901', '']
+INVALID_PHONES = ['23456789012', '123456789', '123456789012', '12345abc678', None]
+
+
+def generate_logistics_data(path='logistics_orders.csv', num_rows=1000, seed=42, invalid_waybill_ratio=0.1,
+                            invalid_phone_ratio=0.1, chunk_size=1_000_000):
+    """物流运单数据（异常运单号/电话，两者比例分别控制、相互独立）"""
+
+    def make_chunk(rng, start, size):
+        invalid_waybill = rng.random(size) < invalid_waybill_ratio
+        invalid_phone = rng.random(size) < invalid_phone_ratio
+        waybill = _random_digits(rng, size, 12).where(~invalid_waybill, _pick(rng, INVALID_WAYBILLS, size))
+        phone = ('1' + _random_digits(rng, size, 10)).where(~invalid_phone, _pick(rng, INVALID_PHONES, size))
+        return pd.DataFrame({
+            "运单号": waybill,
+            "收货人电话": phone,
+            "订单金额": np.round(rng.uniform(10, 1000, size), 2),
+            "创建时间": pd.Timestamp('2023-01-01') + pd.to_timedelta(10 * np.arange(start + 1, start + size + 1), unit='m')
+        })
+
+    return _write_chunks(path, num_rows, make_chunk, seed, chunk_size, encoding='utf-8')
+
+
+# ---------------- 电商订单 ----------------
+CITIES = ["北京", "上海", "广州", "深圳", "杭州", "成都"]
+ADDRESS_SUFFIX = ["路1号", "路2号", "街道3号", "大道4号"]
+
+
+def generate_order_data(path='ecommerce_orders.csv', num_rows=500, seed=42, num_users=100,
+                        abnormal_amount_ratio=0.1, missing_address_ratio=0.1, repeat_ratio=0.04,
+                        repeat_window_minutes=10, chunk_size=1_000_000):
+    """电商订单数据（异常金额、缺失地址、同一用户短时间内重复下单）"""
+    user_labels = _labels('USER_', num_users, 4)
+
+    def make_chunk(rng, start, size):
+        user = rng.integers(1, num_users + 1, size)
+        minutes = rng.integers(0, 30 * 24 * 60, size)
+        amount = np.where(
+            rng.random(size) < abnormal_amount_ratio,
+            np.array([-1000, 0, 999999])[rng.integers(0, 3, size)],
+            np.round(rng.uniform(10, 5000, size), 2)
+        )
+        address = pd.Series(np.char.add(
+            np.asarray(CITIES)[rng.integers(0, len(CITIES), size)],
+            np.asarray(ADDRESS_SUFFIX)[rng.integers(0, len(ADDRESS_SUFFIX), size)]
+        )).where(rng.random(size) >= missing_address_ratio)
+
+        # 重复订单：沿用上一行的用户，下单时间晚repeat_window_minutes分钟
+        repeat = np.flatnonzero(rng.random(size) < repeat_ratio)
+        repeat = repeat[repeat > 0]
+        user[repeat] = user[repeat - 1]
+        minutes[repeat] = minutes[repeat - 1] + repeat_window_minutes
+
+        return pd.DataFrame({
+            "订单ID": _row_ids('ORDER_', start, size, 6),
+            "用户ID": user_labels[user],
+            "订单金额": amount,
+            "收货地址": address,
+            "下单时间": (pd.Timestamp('2023-01-01') + pd.to_timedelta(minutes, unit='m')).strftime("%Y-%m-%d %H:%M:%S")
+        })
+
+    return _write_chunks(path, num_rows, make_chunk, seed, chunk_size)
+
+
+# ---------------- 社交媒体发帖 ----------------
+def generate_social_data(path='social_media_data_with_bots.csv', num_rows=20400, seed=42,
+                         num_normal_users=900, num_bot_users=100, bot_post_ratio=0.735,
+                         chunk_size=1_000_000):
+    """社交媒体发帖数据（机器人集中在3天内高频发帖、共用IP）"""
+    normal_labels = _labels('U', num_normal_users, 5)
+    bot_labels = _labels('BOT', num_bot_users, 3)
+    # 机器人IP由编号确定，保证同一机器人IP固定
+    bot_numbers = np.arange(num_bot_users + 1)
+    bot_ips = ('10.0.' + pd.Series(bot_numbers % 2 + 1).astype(str) + '.'
+               + pd.Series(bot_numbers % 254 + 1).astype(str)).to_numpy()
+
+    def make_chunk(rng, start, size):
+        is_bot = rng.random(size) < bot_post_ratio
+        normal_user = rng.integers(1, num_normal_users + 1, size)
+        bot_user = rng.integers(1, num_bot_users + 1, size)
+        user_id = np.where(is_bot, bot_labels[bot_user], normal_labels[normal_user])
+        normal_ip = ('192.168.' + pd.Series(rng.integers(1, 3, size)).astype(str) + '.'
+                     + pd.Series(rng.integers(1, 255, size)).astype(str))
+        minutes = np.where(
+            is_bot,
+            rng.integers(0, 3 * 24 * 60, size),            # 3天内密集发帖
+            rng.integers(0, 30, size) * 24 * 60            # 30天内按天发帖
+        )
+        row = pd.Series(np.arange(start, start + size)).astype(str)
+        return pd.DataFrame({
+            "user_id": user_id,
+            "register_ip": np.where(is_bot, bot_ips[bot_user], normal_ip),
+            "post_date": pd.Timestamp('2023-01-01') + pd.to_timedelta(minutes, unit='m'),
+            "is_bot": is_bot,
+            "username": 'user_' + row,
+            "post_content": 'Post ' + row
+        })
+
+    return _write_chunks(path, num_rows, make_chunk, seed, chunk_size, encoding='utf-8')
+
+
+# ---------------- 金融交易 ----------------
+def generate_transaction_data(path='transactions.csv', num_rows=1000, seed=42, num_customers=100,
+                              high_risk_ratio=0.1, chunk_size=1_000_000):
+    """银行交易流水（high_risk_ratio比例的交易金额超过账户余额50%，即高风险交易）"""
+    customer_labels = _labels('C', num_customers, 4)
+
+    def make_chunk(rng, start, size):
+        balance = np.round(rng.uniform(1000, 200000, size), 2)
+        # 交易金额占余额的比例：高风险交易为51%~150%，其余为1%~49%（两侧留余量，取整后不会越过50%）
+        high_risk = rng.random(size) < high_risk_ratio
+        ratio = np.where(high_risk, rng.uniform(0.51, 1.5, size), rng.uniform(0.01, 0.49, size))
+        return pd.DataFrame({
+            "交易ID": _row_ids('T', start - 1, size, 6),
+            "客户ID": customer_labels[rng.integers(1, num_customers + 1, size)],
+            "交易时间": pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 30, size), unit='D'),
+            "交易金额": np.round(balance * ratio, 2),
+            "账户余额": balance
+        })
+
+    return _write_chunks(path, num_rows, make_chunk, seed, chunk_size, encoding='utf-8')
+
+
+# ---------------- 问卷调查 ----------------
+TYPO_MAP = {
+    "非常": ["灰常", "灰长", "飞常"],
+    "很好": ["狠好", "痕好", "恨好"],
+    "问题": ["问提", "问題", "问提"],
+    "建议": ["建意", "建言", "建议"],
+    "使用": ["使佣", "实用", "使用"]
+}
+SENSITIVE_WORDS = ["XX党", "XX宗教", "非法组织", "违禁词A", "违禁词B"]
+BASE_RESPONSES = [
+    "这个产品非常棒，用户体验很好！",
+    "服务态度需要改进，沟通效率不高。",
+    "功能齐全，但使用起来有些复杂。",
+    "总体满意，没有明显问题。",
+    "价格合理，性价比很高。"
+]
+
+
+def generate_survey_data(path='survey_data.csv', num_rows=1000, seed=42, typo_prob=0.3,
+                         sensitive_prob=0.2, chunk_size=1_000_000):
+    """问卷意见反馈（随机注入错别字和敏感词）"""
+
+    def make_chunk(rng, start, size):
+        base = rng.integers(0, len(BASE_RESPONSES), size)
+        text = pd.Series(np.asarray(BASE_RESPONSES)[base])
+        # 注入错别字：每个词按概率替换为随机一个错别字（只替换第一次出现）
+        for correct, typos in TYPO_MAP.items():
+            inject = rng.random(size) < typo_prob
+            choice = rng.integers(0, len(typos), size)
+            for i, typo in enumerate(typos):
+                mask = inject & (choice == i)
+                text[mask] = text[mask].str.replace(correct, typo, n=1, regex=False)
+
+        # 注入敏感词：插入到文本前半部分的随机位置（按插入位置分组切片）
+        inject = rng.random(size) < sensitive_prob
+        word = pd.Series(np.asarray(SENSITIVE_WORDS)[rng.integers(0, len(SENSITIVE_WORDS), size)])
+        half = np.maximum(text.str.len().to_numpy() // 2, 1)
+        position = (rng.random(size) * half).astype(int)
+        for pos in np.unique(position[inject]):
+            mask = inject & (position == pos)
+            text[mask] = text[mask].str[:pos] + word[mask] + text[mask].str[pos:]
+
+        return pd.DataFrame({"意见反馈": text})
+
+    return _write_chunks(path, num_rows, make_chunk, seed, chunk_size)
+
+
+if __name__ == "__main__":
+    generate_salary_data()
+    generate_patient_data()
+    generate_logistics_data()
+    generate_order_data()
+    generate_social_data()
+    generate_transaction_data()
+    generate_survey_data()
@@ -50,19 +50,36 @@
 # print(df[df['收货人电话'].isna() | ~df['运单号'].str.isdigit()].head(3))
 
 
+import os
+import json
+import math
+import numpy as np
 import pandas as pd
 import re
 import chardet
+from 阶段结果缓存 import StageCache, CachedStagesMixin, cached_stage
 
+# 校验规则（预编译，批量校验与常驻校验服务共用）
+# 用[0-9]而非\d：\d会匹配全角等Unicode数字，int()后与半角号码成为同一个键；\Z：不接受末尾换行
+WAYBILL_PATTERN = re.compile(r'^[0-9]{12}\Z')
+PHONE_PATTERN = re.compile(r'^1[0-9]{10}\Z')
+WAYBILL_ERROR = '运单号不符合12位数字规则'
+PHONE_ERROR = '电话号码不符合11位1开头规则'
+HISTORY_ERROR = '运单号与历史运单重复'
 
-class LogisticsValidator:
-    def __init__(self, file_path):
+
+class LogisticsValidator(CachedStagesMixin):
+    def __init__(self, file_path, cache=None):
         # 自动检测文件编码
         self.encoding = self._detect_encoding(file_path)
-        # 使用检测到的编码读取文件
-        self.df = pd.read_csv(file_path, encoding=self.encoding, engine='python')
+        # 数据在首次使用时读取（缓存命中时无需解析）
+        self._init_stages(file_path, cache)
         self.invalid_records = pd.DataFrame()
 
+    def _read_df(self):
+        """使用检测到的编码读取文件"""
+        return pd.read_csv(self.file_path, encoding=self.encoding, engine='python')
+
     def _detect_encoding(self, file_path, sample_size=10000):
         """自动检测文件编码"""
         try:
@@ -75,17 +92,33 @@ class LogisticsValidator:
             print(f"编码检测失败：{e}，默认使用utf-8")
             return 'utf-8'
 
+    @cached_stage(state=('invalid_records',))
     def validate_waybill(self):
         """校验运单号：必须为12位数字"""
-        pattern = r'^\d{12}$'
-        mask = self.df['运单号'].astype(str).str.match(pattern, na=False)
-        self._log_invalid(~mask, '运单号不符合12位数字规则')
+        mask = self.df['运单号'].astype(str).str.match(WAYBILL_PATTERN, na=False)
+        self._log_invalid(~mask, WAYBILL_ERROR)
 
+    @cached_stage(state=('invalid_records',))
     def validate_phone(self):
         """校验电话号码：必须为11位且以1开头"""
-        pattern = r'^1\d{10}$'
-        mask = self.df['收货人电话'].astype(str).str.match(pattern, na=False)
-        self._log_invalid(~mask, '电话号码不符合11位1开头规则')
+        mask = self.df['收货人电话'].astype(str).str.match(PHONE_PATTERN, na=False)
+        self._log_invalid(~mask, PHONE_ERROR)
+
+    def validate_history(self, index):
+        """校验运单号是否与历史批次重复（基于持久化运单索引）"""
+        waybills = self.df['运单号'].astype(str)
+        well_formed = waybills.str.match(WAYBILL_PATTERN, na=False)
+        seen = np.zeros(len(self.df), dtype=bool)
+        seen[well_formed.to_numpy()] = index.contains(waybills[well_formed].astype(np.uint64).to_numpy())
+        self._log_invalid(pd.Series(seen, index=self.df.index), HISTORY_ERROR)
+
+    def commit_waybills(self, index):
+        """将本批次有效记录的运单号批量写入历史索引"""
+        valid_mask = ~self.df.index.isin(self.invalid_records.index)
+        waybills = self.df.loc[valid_mask, '运单号'].astype(str)
+        waybills = waybills[waybills.str.match(WAYBILL_PATTERN, na=False)]
+        added = index.add(waybills.astype(np.uint64).to_numpy())
+        print(f"历史运单索引新增：{added}条（累计{index.count}条）")
 
     def _log_invalid(self, mask, error_msg):
         """记录错误信息"""
@@ -108,15 +141,263 @@ class LogisticsValidator:
         print(f"无效数据保存至：{invalid_output}")
 
 
+class WaybillIndex:
+    """跨文件运单号去重索引（磁盘持久化）
+
+    运单号以uint64存放在若干有序段文件中（.npy，内存映射读取），
+    段按大小分层合并，段数保持在O(log N)；前置布隆过滤器，
+    绝大多数新运单号只需几次位探测即可排除，查询成本不随历史增长。
+    新段、合并段和重建的布隆过滤器都写入新文件并落盘，再随元数据原子发布；
+    唯一的原地修改是容量范围内追加运单号时在当前布隆过滤器中置位（只增不减，
+    读取方提前看到新位只会多出误判，由段文件二分查找排除）。
+    索引以只读方式映射，只有 add 时才以读写方式重新映射布隆过滤器，
+    其他进程可按元数据变化重新打开。
+    """
+
+    META_FILE = 'meta.json'
+    BLOOM_FILE = 'bloom.bits'  # 元数据未记录bloom_file时的默认文件名
+
+    def __init__(self, index_dir='waybill_index', capacity=10_000_000, fp_rate=0.01):
+        self.index_dir = index_dir
+        os.makedirs(index_dir, exist_ok=True)
+        if not os.path.exists(self._path(self.META_FILE)):
+            self.meta = {'segments': [], 'next_segment': 0, 'count': 0, 'fp_rate': fp_rate}
+            self.meta.update(self._init_bloom(capacity))
+            self._save_meta()
+        self._open()
+
+    def _meta_version(self):
+        """元数据文件的版本标识（原子替换会产生新inode，修改时间和大小兜底）"""
+        stat = os.stat(self._path(self.META_FILE))
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _open(self):
+        """读取元数据并映射其引用的布隆过滤器和段文件"""
+        version = self._meta_version()
+        with open(self._path(self.META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        bloom_file = meta.get('bloom_file', self.BLOOM_FILE)
+        bloom = np.memmap(self._path(bloom_file), dtype=np.uint8, mode='r')
+        segments = [self._load_segment(name) for name in meta['segments']]
+        self.meta, self._bloom, self._segments, self._version = meta, bloom, segments, version
+
+    def refresh(self, retries=3):
+        """元数据被其他进程（如 commit_waybills）更新后重新加载，返回是否重新加载
+
+        供常驻只读方在查询前调用，未变化时只需一次stat。写入方发布新元数据后
+        会删除被合并的旧段，读到的元数据若已过期则重试。
+        """
+        if self._meta_version() == self._version:
+            return False
+        for attempt in range(retries):
+            try:
+                self._open()
+                return True
+            except FileNotFoundError:
+                if attempt == retries - 1:
+                    raise
+
+    @property
+    def count(self):
+        return self.meta['count']
+
+    def _path(self, name):
+        return os.path.join(self.index_dir, name)
+
+    def _bloom_file(self):
+        return self.meta.get('bloom_file', self.BLOOM_FILE)
+
+    def _new_file_name(self, prefix, suffix):
+        name = f"{prefix}_{self.meta['next_segment']:08d}{suffix}"
+        self.meta['next_segment'] += 1
+        return name
+
+    def _init_bloom(self, capacity):
+        """按容量和误判率确定布隆过滤器位数（取2的幂）和哈希个数，并创建全零的新过滤器文件
+
+        返回过滤器参数，由调用方填充后随元数据一起发布。
+        """
+        bits = -capacity * math.log(self.meta['fp_rate']) / math.log(2) ** 2
+        bits = 1 << max(int(math.ceil(math.log2(max(bits, 64)))), 6)
+        name = self._new_file_name('bloom', '.bits')
+        with open(self._path(name), 'wb') as f:
+            f.truncate(bits // 8)
+        return {'bloom_file': name, 'capacity': capacity, 'bloom_bits': bits,
+                'bloom_hashes': max(1, round(bits / capacity * math.log(2)))}
+
+    def _load_segment(self, name):
+        return np.load(self._path(name), mmap_mode='r')
+
+    def _fsync(self, name=None):
+        """将文件（name为None时为索引目录）落盘"""
+        if name is not None:
+            with open(self._path(name), 'rb+') as f:
+                os.fsync(f.fileno())
+        elif os.name != 'nt':  # Windows不支持对目录fsync
+            dir_fd = os.open(self.index_dir, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    def _remove_files(self, names):
+        """删除已不被元数据引用的文件（Windows下仍被其他进程映射的文件删除失败时保留）"""
+        for name in names:
+            try:
+                os.remove(self._path(name))
+            except OSError:
+                pass
+
+    def _save_meta(self):
+        """布隆过滤器落盘后原子写入元数据"""
+        if hasattr(self, '_bloom') and self._bloom.mode == 'r+':
+            self._bloom.flush()
+        meta_path = self._path(self.META_FILE)
+        with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(meta_path + '.tmp', meta_path)
+        self._fsync()
+        self._version = self._meta_version()
+
+    @staticmethod
+    def _mix(keys):
+        """splitmix64混合函数（向量化）"""
+        x = keys.astype(np.uint64)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+        return x ^ (x >> np.uint64(31))
+
+    @classmethod
+    def _bloom_positions(cls, keys, params):
+        """双重哈希生成每个键的k个位位置，形状为(k, 键数)"""
+        h1 = cls._mix(keys)
+        h2 = cls._mix(keys ^ np.uint64(0x9e3779b97f4a7c15)) | np.uint64(1)
+        mask = np.uint64(params['bloom_bits'] - 1)
+        steps = np.arange(params['bloom_hashes'], dtype=np.uint64)[:, None]
+        return (h1 + steps * h2) & mask
+
+    def _bloom_add(self, keys, bloom=None, params=None, chunk_size=1_000_000):
+        """将键写入布隆过滤器（默认为当前过滤器）"""
+        if bloom is None:
+            bloom, params = self._bloom, self.meta
+        for start in range(0, len(keys), chunk_size):
+            pos = self._bloom_positions(keys[start:start + chunk_size], params).ravel()
+            np.bitwise_or.at(bloom, pos >> np.uint64(3),
+                             (1 << (pos & np.uint64(7))).astype(np.uint8))
+
+    def _bloom_maybe(self, keys):
+        pos = self._bloom_positions(keys, self.meta)
+        bits = (self._bloom[pos >> np.uint64(3)] >> (pos & np.uint64(7)).astype(np.uint8)) & 1
+        return bits.all(axis=0)
+
+    def contains(self, keys):
+        """批量查询运单号是否已存在，返回布尔数组"""
+        keys = np.asarray(keys, dtype=np.uint64)
+        found = np.zeros(len(keys), dtype=bool)
+        if not len(keys) or not self.count:
+            return found
+        # 布隆过滤器排除绝大多数新键，仅对疑似存在的键做二分查找
+        candidates = np.flatnonzero(self._bloom_maybe(keys))
+        pending = keys[candidates]
+        for segment in self._segments:
+            if not len(pending):
+                break
+            pos = np.minimum(np.searchsorted(segment, pending), len(segment) - 1)
+            hit = segment[pos] == pending
+            found[candidates[hit]] = True
+            candidates, pending = candidates[~hit], pending[~hit]
+        return found
+
+    def add(self, keys):
+        """批量追加运单号（自动去除批内及历史重复），返回新增数量"""
+        keys = np.unique(np.asarray(keys, dtype=np.uint64))
+        keys = keys[~self.contains(keys)]
+        if not len(keys):
+            return 0
+
+        name = self._new_file_name('seg', '.npy')
+        np.save(self._path(name), keys)
+        self._fsync(name)
+        self.meta['segments'].append(name)
+        self.meta['count'] += len(keys)
+        self._segments.append(self._load_segment(name))
+
+        if self.count > self.meta['capacity']:
+            self._rebuild_bloom(2 * self.count)
+        else:
+            if self._bloom.mode != 'r+':  # 写入路径才以读写方式映射
+                self._bloom = np.memmap(self._path(self._bloom_file()), dtype=np.uint8, mode='r+')
+            self._bloom_add(keys)
+        self._compact()
+        self._save_meta()
+        return len(keys)
+
+    def _compact(self):
+        """分层合并：最新段不小于前一段的一半时两段合并"""
+        while len(self._segments) >= 2 and 2 * len(self._segments[-1]) >= len(self._segments[-2]):
+            old_names = self.meta['segments'][-2:]
+            name = self._new_file_name('seg', '.npy')
+            self._merge_segments(self._segments[-2], self._segments[-1], name)
+            self.meta['segments'][-2:] = [name]
+            self._segments[-2:] = [self._load_segment(name)]
+            self._save_meta()
+            self._remove_files(old_names)
+
+    def _merge_segments(self, a, b, name, chunk_size=4_000_000):
+        """分块归并两个有序段，直接写入输出文件的内存映射，内存占用与段大小无关"""
+        merged = np.lib.format.open_memmap(self._path(name), mode='w+', dtype=np.uint64, shape=(len(a) + len(b),))
+        i = j = out = 0
+        while i < len(a) and j < len(b):
+            block_a, block_b = a[i:i + chunk_size], b[j:j + chunk_size]
+            # 取两块末尾较小者为界，界内的元素已全部出现在两块中，归并后可直接输出
+            bound = min(block_a[-1], block_b[-1])
+            block_a = block_a[:np.searchsorted(block_a, bound, side='right')]
+            block_b = block_b[:np.searchsorted(block_b, bound, side='right')]
+            size = len(block_a) + len(block_b)
+            merged[out:out + size] = np.sort(np.concatenate([block_a, block_b]))
+            i, j, out = i + len(block_a), j + len(block_b), out + size
+        for rest, start in ((a, i), (b, j)):
+            for pos in range(start, len(rest), chunk_size):
+                block = rest[pos:pos + chunk_size]
+                merged[out:out + len(block)] = block
+                out += len(block)
+        merged.flush()
+        del merged
+        self._fsync(name)
+
+    def _rebuild_bloom(self, capacity):
+        """历史规模超过容量时扩容：在新文件中从段文件重建布隆过滤器，落盘后随元数据一起发布
+
+        重建过程中旧过滤器和元数据保持不变，中途崩溃不会让元数据与未填满的过滤器配对（漏判历史重复）。
+        """
+        params = self._init_bloom(capacity)
+        bloom = np.memmap(self._path(params['bloom_file']), dtype=np.uint8, mode='r+')
+        for segment in self._segments:
+            self._bloom_add(segment, bloom, params)
+        bloom.flush()
+        self._fsync(params['bloom_file'])
+        old_name = self._bloom_file()
+        self.meta.update(params)
+        self._bloom = bloom
+        self._save_meta()
+        self._remove_files([old_name])
+
+
 if __name__ == "__main__":
     try:
-        validator = LogisticsValidator('logistics_orders.csv')
+        validator = LogisticsValidator('logistics_orders.csv', cache=StageCache())
         validator.validate_waybill()
         validator.validate_phone()
+        # 跨文件校验：与历史批次的运单号比对
+        waybill_index = WaybillIndex('waybill_index')
+        validator.validate_history(waybill_index)
         validator.save_results(
             valid_output='valid_orders.csv',
             invalid_output='invalid_orders_report.csv'
         )
+        validator.commit_waybills(waybill_index)
         print("\n无效数据示例：")
         print(pd.read_csv('invalid_orders_report.csv').head(3))
     except Exception as e:
@@ -0,0 +1,262 @@
+"""
+物流运单常驻校验服务
+
+LogisticsValidator 每次调用都要检测编码、解析CSV，不适合下单系统逐批实时校验。
+本服务常驻内存（本地HTTP），校验规则预编译，接收JSON（或安装pyarrow时的Arrow）批次，
+返回逐行校验结果和错误原因；多个并发请求在可配置的延迟上限内合并成一个微批次统一校验。
+
+用法：
+    python 物流运单校验服务.py                 启动服务（默认 127.0.0.1:8765）
+    python 物流运单校验服务.py --index-dir waybill_index --max-delay-ms 2 --max-batch-rows 10000
+                                               启用历史重复校验并设置微批参数
+    python 物流运单校验服务.py loadtest        压测：输出p50/p99延迟和吞吐量
+"""
+import argparse
+import json
+import time
+import queue
+import random
+import threading
+import http.client
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from 物流运单数据校验 import (
+    WAYBILL_PATTERN, PHONE_PATTERN, WAYBILL_ERROR, PHONE_ERROR, HISTORY_ERROR, WaybillIndex
+)
+
+try:
+    import pyarrow as pa
+except ImportError:  # 未安装pyarrow时只支持JSON
+    pa = None
+
+ARROW_CONTENT_TYPE = 'application/vnd.apache.arrow.stream'
+
+
+def validate_rows(waybills, phones, index=None):
+    """逐行校验运单号和电话，返回 (是否有效列表, 错误原因列表)"""
+    errors = [[] for _ in waybills]
+    well_formed = []
+    for i, (waybill, phone) in enumerate(zip(waybills, phones)):
+        if waybill is not None and WAYBILL_PATTERN.match(str(waybill)):
+            well_formed.append(i)
+        else:
+            errors[i].append(WAYBILL_ERROR)
+        if phone is None or not PHONE_PATTERN.match(str(phone)):
+            errors[i].append(PHONE_ERROR)
+
+    # 历史重复校验（整批向量化查询）
+    if index is not None and well_formed:
+        keys = np.array([int(waybills[i]) for i in well_formed], dtype=np.uint64)
+        for i, seen in zip(well_formed, index.contains(keys)):
+            if seen:
+                errors[i].append(HISTORY_ERROR)
+    return [not e for e in errors], errors
+
+
+class MicroBatcher:
+    """微批处理：合并并发请求，在max_delay_ms内或达到max_batch_rows时统一校验"""
+
+    def __init__(self, index=None, max_delay_ms=2.0, max_batch_rows=10000):
+        self.index = index
+        self.max_delay = max_delay_ms / 1000
+        self.max_batch_rows = max_batch_rows
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, waybills, phones):
+        """提交一个批次并等待结果"""
+        job = {'waybills': waybills, 'phones': phones, 'done': threading.Event()}
+        self._queue.put(job)
+        job['done'].wait()
+        if 'error' in job:
+            raise job['error']
+        return job['result']
+
+    def _run(self):
+        while True:
+            jobs = [self._queue.get()]
+            rows = len(jobs[0]['waybills'])
+            deadline = time.perf_counter() + self.max_delay
+            while rows < self.max_batch_rows:
+                timeout = deadline - time.perf_counter()
+                try:
+                    job = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                jobs.append(job)
+                rows += len(job['waybills'])
+            self._process(jobs)
+
+    def _process(self, jobs):
+        waybills = [w for job in jobs for w in job['waybills']]
+        phones = [p for job in jobs for p in job['phones']]
+        try:
+            # 其他进程提交新运单号后重新加载索引（未变化时只需一次stat）
+            if self.index is not None:
+                self.index.refresh()
+            valid, errors = validate_rows(waybills, phones, self.index)
+        except Exception as e:
+            for job in jobs:
+                job['error'] = e
+                job['done'].set()
+            return
+        start = 0
+        for job in jobs:
+            end = start + len(job['waybills'])
+            job['result'] = (valid[start:end], errors[start:end])
+            job['done'].set()
+            start = end
+
+
+def parse_batch(body, content_type):
+    """解析请求体：列式JSON {"运单号": [...], "收货人电话": [...]}、
+    行式JSON {"records": [{...}, ...]} 或 Arrow IPC流"""
+    if content_type == ARROW_CONTENT_TYPE:
+        if pa is None:
+            raise ValueError('服务端未安装pyarrow，不支持Arrow格式')
+        table = pa.ipc.open_stream(body).read_all()
+        return table.column('运单号').to_pylist(), table.column('收货人电话').to_pylist()
+    payload = json.loads(body)
+    if not isinstance(payload, dict):
+        raise ValueError('请求体必须为JSON对象')
+    if 'records' in payload:
+        records = payload['records']
+        if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+            raise ValueError('records必须为对象数组')
+        return [r.get('运单号') for r in records], [r.get('收货人电话') for r in records]
+    waybills, phones = payload['运单号'], payload['收货人电话']
+    if not isinstance(waybills, list) or not isinstance(phones, list):
+        raise ValueError('运单号和收货人电话必须为数组')
+    if len(waybills) != len(phones):
+        raise ValueError('运单号与收货人电话数量不一致')
+    return waybills, phones
+
+
+def make_handler(batcher):
+    class ValidationHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # 长连接，避免每批重新建连
+        disable_nagle_algorithm = True  # 响应头和响应体分两次写出，关闭Nagle避免约40ms的延迟确认等待
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._reply(200, {'status': 'ok'})
+            else:
+                self._reply(404, {'error': '未知路径'})
+
+        def do_POST(self):
+            if self.path != '/validate':
+                self._reply(404, {'error': '未知路径'})
+                return
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            try:
+                waybills, phones = parse_batch(body, self.headers.get('Content-Type'))
+            except Exception as e:
+                self._reply(400, {'error': f"请求解析失败：{e}"})
+                return
+            try:
+                valid, errors = batcher.submit(waybills, phones)
+            except Exception as e:
+                self._reply(500, {'error': f"校验失败：{e}"})
+                return
+            self._reply(200, {'valid': valid, 'errors': errors})
+
+        def _reply(self, status, payload):
+            data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass  # 关闭逐请求日志，降低延迟
+
+    return ValidationHandler
+
+
+def serve(host='127.0.0.1', port=8765, index_dir=None, max_delay_ms=2.0, max_batch_rows=10000):
+    """启动常驻校验服务"""
+    index = WaybillIndex(index_dir) if index_dir else None
+    batcher = MicroBatcher(index, max_delay_ms, max_batch_rows)
+    server = ThreadingHTTPServer((host, port), make_handler(batcher))
+    server.daemon_threads = True
+    print(f"运单校验服务已启动：http://{host}:{port}/validate（微批延迟上限{max_delay_ms}ms）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+def _sample_batch(rng, batch_size, invalid_ratio=0.1):
+    """生成压测用批次（约invalid_ratio比例的异常数据）"""
+    waybills, phones = [], []
+    for _ in range(batch_size):
+        if rng.random() < invalid_ratio:
+            waybills.append(rng.choice(['A12345678901', '123456', '']))
+            phones.append(rng.choice(['23456789012', '12345abc678', None]))
+        else:
+            waybills.append(f"{rng.randrange(10 ** 12):012d}")
+            phones.append(f"1{rng.randrange(10 ** 10):010d}")
+    return json.dumps({'运单号': waybills, '收货人电话': phones}).encode('utf-8')
+
+
+def run_load_test(host='127.0.0.1', port=8765, concurrency=8, requests_per_worker=500, batch_size=50):
+    """压测客户端：并发发送批次，统计p50/p99延迟与吞吐量"""
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(seed):
+        rng = random.Random(seed)
+        bodies = [_sample_batch(rng, batch_size) for _ in range(20)]
+        conn = http.client.HTTPConnection(host, port)
+        local = []
+        for i in range(requests_per_worker):
+            start = time.perf_counter()
+            conn.request('POST', '/validate', body=bodies[i % len(bodies)],
+                         headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            response.read()
+            local.append(time.perf_counter() - start)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    stats = {
+        'requests': len(latencies),
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'requests_per_sec': len(latencies) / elapsed,
+        'rows_per_sec': len(latencies) * batch_size / elapsed,
+    }
+    print(f"请求数：{stats['requests']}（并发{concurrency}，每批{batch_size}条）")
+    print(f"延迟：p50={stats['p50_ms']:.2f}ms  p99={stats['p99_ms']:.2f}ms")
+    print(f"吞吐量：{stats['requests_per_sec']:.0f}批/秒，{stats['rows_per_sec']:.0f}条/秒")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='物流运单常驻校验服务')
+    parser.add_argument('mode', nargs='?', choices=['serve', 'loadtest'], default='serve')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--index-dir', help='运单号历史索引目录，指定后启用历史重复校验')
+    parser.add_argument('--max-delay-ms', type=float, default=2.0, help='微批合并的延迟上限（毫秒）')
+    parser.add_argument('--max-batch-rows', type=int, default=10000, help='单个微批的最大行数')
+    args = parser.parse_args()
+    try:
+        if args.mode == 'loadtest':
+            run_load_test(args.host, args.port)
+        else:
+            serve(args.host, args.port, args.index_dir, args.max_delay_ms, args.max_batch_rows)
+    except Exception as e:
+        print(f"运行失败：{e}")
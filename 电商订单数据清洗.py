@@ -61,18 +61,27 @@
 # print(df[(df['订单金额'] <= 0) | (df['收货地址'].isna())].head(3))
 
 
+import re
+import zlib
+import unicodedata
+import numpy as np
 import pandas as pd
 import chardet
+from 阶段结果缓存 import StageCache, CachedStagesMixin, cached_stage
 
 
-class OrderDataCleaner:
-    def __init__(self, file_path):
+class OrderDataCleaner(CachedStagesMixin):
+    def __init__(self, file_path, cache=None):
         # 自动检测文件编码
         self.encoding = self._detect_encoding(file_path)
-        # 使用检测到的编码读取文件
-        self.df = pd.read_csv(file_path, encoding=self.encoding,parse_dates=['下单时间'],engine='python')
+        # 数据在首次使用时读取（缓存命中时无需解析）
+        self._init_stages(file_path, cache)
         self.invalid_records = pd.DataFrame()
 
+    def _read_df(self):
+        """使用检测到的编码读取文件"""
+        return pd.read_csv(self.file_path, encoding=self.encoding,parse_dates=['下单时间'],engine='python')
+
     def _detect_encoding(self, file_path, sample_size=10000):
         """自动检测文件编码"""
         try:
@@ -85,16 +94,19 @@ class OrderDataCleaner:
             print(f"编码检测失败：{e}，默认使用utf-8")
             return 'utf-8'
 
+    @cached_stage()
     def clean_amount(self):
         """清理异常金额：保留0 < 金额 < 100000的订单"""
         self.df = self.df[(self.df['订单金额'] > 0) & (self.df['订单金额'] < 100000)]
         return self.df
 
+    @cached_stage()
     def fill_missing_address(self):
         """填充缺失地址为'地址未填写'"""
         self.df['收货地址'] = self.df['收货地址'].fillna('地址未填写')
         return self.df
 
+    @cached_stage()
     def detect_repeat_orders(self, time_window_minutes=10):
         """标记同一用户10分钟内重复订单"""
         # 按用户和时间排序
@@ -105,6 +117,137 @@ class OrderDataCleaner:
         self.df['疑似重复'] = (self.df['时间差'] <= time_window_minutes) & (self.df['时间差'].notna())
         return self.df
 
+    @cached_stage()
+    def detect_near_duplicates(self, time_window_minutes=10, amount_tolerance=0.01,
+                               similarity_threshold=0.8, num_perm=32, bands=8, max_lag=50, seed=42):
+        """标记近似重复订单（可跨账户）：地址相同或相近、时间窗口内、金额近似相等
+
+        对归一化地址的字二元组做MinHash/LSH分桶，桶内按下单时间排序后只比较
+        时间窗口内的邻近订单（每单最多max_lag个），避免O(n²)两两比较；
+        候选对再校验时间差、金额差和地址相似度，最后合并成重复组。
+        """
+        n = len(self.df)
+        times = self.df['下单时间']
+        amounts = self.df['订单金额'].to_numpy(dtype=float)
+
+        # 地址归一化（只处理不重复的地址）
+        codes, uniques = pd.factorize(self.df['收货地址'])
+        normalized = [self._normalize_address(a) for a in uniques]
+        norm_codes, norm_values = pd.factorize(pd.Series(normalized, dtype=object))
+        # 缺失地址（归一化为空串）不参与比较，否则所有无地址订单会互为候选
+        norm_codes[np.asarray(norm_values == '', dtype=bool)[norm_codes]] = -1
+        address = np.where(codes >= 0, np.append(norm_codes, -1)[codes], -1)
+        included = np.flatnonzero((address >= 0) & times.notna().to_numpy())
+
+        # 每个归一化地址的MinHash分段键
+        grams = [self._bigrams(text) for text in norm_values]
+        band_keys = self._minhash_band_keys(grams, num_perm, bands, seed)
+
+        # 各分段桶内按时间窗口生成候选对，先按金额筛掉大部分候选
+        seconds = times.to_numpy(dtype='datetime64[s]').astype(np.int64)[included]
+        addr = address[included]
+        max_gap = time_window_minutes * 60
+        candidates = [np.empty(0, dtype=np.int64)]
+        for band in range(band_keys.shape[1]):
+            pairs = included[self._window_pairs(band_keys[addr, band], seconds, max_gap, max_lag)]
+            amount_a, amount_b = amounts[pairs[:, 0]], amounts[pairs[:, 1]]
+            close = np.abs(amount_a - amount_b) <= \
+                amount_tolerance * np.maximum(np.abs(amount_a), np.abs(amount_b))
+            pairs = np.sort(pairs[close], axis=1)
+            candidates.append(pairs[:, 0] * n + pairs[:, 1])  # 编码为单个整数便于去重
+        pair_ids = np.unique(np.concatenate(candidates))
+        left, right = pair_ids // n, pair_ids % n
+
+        # 候选对校验：地址相似度达到阈值
+        keep = self._address_similar(address[left], address[right], grams, similarity_threshold)
+        left, right = left[keep], right[keep]
+
+        # 合并为重复组（标签传播 + 指针跳跃，得到连通分量）
+        labels = np.arange(n)
+        while len(left):
+            low = np.minimum(labels[left], labels[right])
+            merged = labels.copy()
+            np.minimum.at(merged, left, low)
+            np.minimum.at(merged, right, low)
+            merged = merged[merged]
+            if (merged == labels).all():
+                break
+            labels = merged
+
+        in_group = np.zeros(n, dtype=bool)
+        in_group[left] = in_group[right] = True
+        group = np.full(n, -1)
+        group[in_group] = pd.factorize(labels[in_group])[0]
+        self.df['近似重复组'] = group
+        self.df['疑似近似重复'] = in_group
+        return self.df
+
+    @staticmethod
+    def _normalize_address(address):
+        """地址归一化：全角转半角、去除空白和标点、统一小写；缺失地址返回空串"""
+        if not isinstance(address, str) or address == '地址未填写':
+            return ''
+        text = unicodedata.normalize('NFKC', address).lower()
+        return re.sub(r'[\s\W_]+', '', text)
+
+    @staticmethod
+    def _bigrams(text):
+        return {text[i:i + 2] for i in range(max(len(text) - 1, 1))}
+
+    @staticmethod
+    def _minhash_band_keys(grams, num_perm, bands, seed):
+        """计算MinHash签名并按band合并为桶键，返回形状为(地址数, bands)的uint64数组"""
+        prime = np.uint64((1 << 31) - 1)
+        shingles = np.array(
+            [zlib.crc32(g.encode('utf-8')) for gs in grams for g in gs], dtype=np.uint64
+        ) % prime
+        starts = np.cumsum([0] + [len(gs) for gs in grams[:-1]])
+
+        rng = np.random.default_rng(seed)
+        a = rng.integers(1, int(prime), num_perm).astype(np.uint64)
+        b = rng.integers(0, int(prime), num_perm).astype(np.uint64)
+        signature = np.empty((len(grams), num_perm), dtype=np.uint64)
+        if len(grams):
+            for k in range(num_perm):
+                signature[:, k] = np.minimum.reduceat((a[k] * shingles + b[k]) % prime, starts)
+
+        rows = num_perm // bands
+        signature = signature[:, :rows * bands].reshape(len(grams), bands, rows)
+        multipliers = np.uint64(0x100000001b3) ** np.arange(rows, dtype=np.uint64)
+        keys = (signature * multipliers).sum(axis=2, dtype=np.uint64)
+        # 不同band的桶互不相通
+        return keys ^ (np.arange(bands, dtype=np.uint64) * np.uint64(0x9e3779b97f4a7c15))
+
+    @staticmethod
+    def _window_pairs(block, seconds, max_gap, max_lag):
+        """按(桶, 时间)排序后线性扫描，返回同桶且时间差不超过max_gap的下标对"""
+        order = np.lexsort((seconds, block))
+        sorted_block, sorted_time = block[order], seconds[order]
+        pairs = [np.empty((0, 2), dtype=np.int64)]
+        for lag in range(1, min(max_lag, len(order) - 1) + 1):
+            close = (sorted_block[lag:] == sorted_block[:-lag]) & \
+                    (sorted_time[lag:] - sorted_time[:-lag] <= max_gap)
+            if not close.any():
+                break  # 已按时间排序，更大的间隔不会再有候选
+            idx = np.flatnonzero(close)
+            pairs.append(np.column_stack([order[idx], order[idx + lag]]))
+        return np.concatenate(pairs)
+
+    @staticmethod
+    def _address_similar(addr_a, addr_b, grams, threshold):
+        """地址相似度校验：归一化后相同直接通过，否则比较字二元组的Jaccard相似度"""
+        similar = addr_a == addr_b
+        differ = np.flatnonzero(~similar)
+        if len(differ):
+            pair_codes, inverse = np.unique(
+                np.column_stack([addr_a[differ], addr_b[differ]]), axis=0, return_inverse=True
+            )
+            scores = np.array([
+                len(grams[x] & grams[y]) / len(grams[x] | grams[y]) for x, y in pair_codes
+            ])
+            similar[differ] = scores[inverse.ravel()] >= threshold
+        return similar
+
     def save_results(self, output_file):
         """保存清洗结果"""
         self.df.to_csv(output_file, index=False, encoding='utf_8_sig')
@@ -113,10 +256,11 @@ class OrderDataCleaner:
 
 if __name__ == "__main__":
     try:
-        cleaner = OrderDataCleaner('ecommerce_orders.csv')
+        cleaner = OrderDataCleaner('ecommerce_orders.csv', cache=StageCache())
         cleaner.clean_amount()  # 清理金额异常
         cleaner.fill_missing_address()  # 填充地址
         cleaner.detect_repeat_orders()  # 标记重复订单
+        cleaner.detect_near_duplicates()  # 标记跨账户近似重复订单
 
         # 保存结果
         cleaner.save_results('cleaned_orders.csv')
@@ -126,6 +270,7 @@ if __name__ == "__main__":
         print(f"总订单数：{len(cleaner.df)}")
         print(f"异常金额删除数：{500 - len(cleaner.df)}")
         print(f"标记重复订单数：{cleaner.df['疑似重复'].sum()}")
+        print(f"近似重复订单数：{cleaner.df['疑似近似重复'].sum()}（{cleaner.df['近似重复组'].max() + 1}组）")
         print("\n重复订单示例：")
         print(cleaner.df[cleaner.df['疑似重复']][['用户ID', '下单时间', '时间差']].head(3))
     except Exception as e:
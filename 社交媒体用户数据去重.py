@@ -57,33 +57,85 @@
 
 
 # social_media_cleaner.py
+import numpy as np
 import pandas as pd
+from 阶段结果缓存 import StageCache, CachedStagesMixin, cached_stage
 
 
-class SocialMediaCleaner:
-    def __init__(self, data_path):
-        self.df = pd.read_csv(data_path, parse_dates=['post_date'])
+class SocialMediaCleaner(CachedStagesMixin):
+    def __init__(self, data_path, cache=None):
+        # 数据在首次使用时读取（缓存命中时无需解析）
+        self._init_stages(data_path, cache)
+
+    def _read_df(self):
+        """读取发帖记录"""
+        return pd.read_csv(self.file_path, parse_dates=['post_date'])
 
     def remove_duplicates(self):
         """任务1：基于(user_id, register_ip)去重（不影响机器人检测）"""
         return self.df.drop_duplicates(subset=['user_id', 'register_ip'])
 
+    def _sorted_posts(self, pad=1):
+        """将(用户, 时间)编码为单个int64键并排序（只需一次排序）
+
+        分钟数从最早发帖当天零点起算；span = 最大分钟数 + pad，
+        键 = 用户编码 * span + 分钟数，按用户、时间单调递增。
+        与groupby一样，user_id或post_date缺失的行不参与编码和统计。
+        返回 (每行用户编码（user_id缺失为-1）, 排序后的键, span,
+        每个用户在排序数组中的起始位置, 每个起始位置对应的用户编码)。
+        """
+        user_codes, _ = pd.factorize(self.df['user_id'])
+        minutes = self.df['post_date'].to_numpy(dtype='datetime64[m]')
+        kept = (user_codes >= 0) & ~np.isnat(minutes)
+        minutes = minutes[kept].astype(np.int64)
+        if not len(minutes):
+            return user_codes, minutes, 1, minutes, minutes
+        minutes = minutes - minutes.min() // 1440 * 1440
+        span = int(minutes.max()) + pad
+        key = np.sort(user_codes[kept] * span + minutes)
+        user_sorted = key // span
+        starts = np.flatnonzero(np.r_[True, user_sorted[1:] != user_sorted[:-1]])
+        return user_codes, key, span, starts, user_sorted[starts]
+
+    @cached_stage()
     def detect_bots(self, daily_threshold=50):
         """任务2：基于原始数据检测高频发帖机器人"""
-        # 计算每个用户每日发帖量
-        user_daily = (
-            self.df.groupby(['user_id', self.df['post_date'].dt.date])
-            .size()
-            .reset_index(name='posts')
-        )
+        # 按整数天桶统计每个用户每日发帖量（排序后相邻相同的(用户, 天)即为同一组）
+        user_codes, key, span, _, _ = self._sorted_posts()
+        user_sorted, day = key // span, key % span // 1440
+        boundaries = np.flatnonzero(np.r_[True, (user_sorted[1:] != user_sorted[:-1]) | (day[1:] != day[:-1]), True])
+        posts = np.diff(boundaries)
         # 标记超过阈值的用户
-        bots = user_daily[user_daily['posts'] > daily_threshold]['user_id'].unique()
-        self.df['is_bot'] = self.df['user_id'].isin(bots)
+        bot_codes = np.unique(user_sorted[boundaries[:-1][posts > daily_threshold]])
+        self.df['is_bot'] = np.isin(user_codes, bot_codes)
+        return self.df
+
+    @cached_stage()
+    def detect_bursts(self, thresholds=None):
+        """任务3：多粒度突发发帖检测（分钟/小时/天滚动窗口）
+
+        thresholds：{窗口分钟数: 阈值}，任一窗口内发帖数超过阈值的用户标记为is_burst。
+        一次排序后，每条帖子向后二分定位窗口终点即得窗口内发帖数，再按用户取最大值。
+        """
+        thresholds = thresholds or {10: 15, 60: 30, 1440: 50}
+        # span留出最大窗口的余量，保证窗口终点不会越到下一个用户
+        user_codes, key, span, starts, group_users = self._sorted_posts(pad=max(thresholds) + 1)
+        n = len(key)
+        # 按用户编码存放统计结果，末尾多留一位给user_id缺失的行（编码-1）
+        max_posts = np.zeros(user_codes.max() + 2 if len(user_codes) else 1, dtype=np.int64)
+        is_burst = np.zeros(len(max_posts), dtype=bool)
+        for window, threshold in thresholds.items():
+            if n:
+                window_posts = np.searchsorted(key, key + window, side='left') - np.arange(n)
+                max_posts[group_users] = np.maximum.reduceat(window_posts, starts)
+            self.df[f'max_posts_{window}m'] = max_posts[user_codes]
+            is_burst |= max_posts > threshold
+        self.df['is_burst'] = is_burst[user_codes]
         return self.df
 
 
 if __name__ == "__main__":
-    processor = SocialMediaCleaner('social_media_data_with_bots.csv')
+    processor = SocialMediaCleaner('social_media_data_with_bots.csv', cache=StageCache())
 
     # 独立任务1：去重（可选）
     dedup_df = processor.remove_duplicates()
@@ -94,5 +146,9 @@ if __name__ == "__main__":
     bot_count = final_df['is_bot'].sum()
     print(f"检测到机器人发帖数：{bot_count}")
 
+    # 独立任务3：多粒度突发检测（捕捉日总量不高但短时间集中发帖的账号）
+    final_df = processor.detect_bursts()
+    print(f"检测到突发发帖用户数：{final_df.loc[final_df['is_burst'], 'user_id'].nunique()}")
+
     # 保存结果（可选保存去重或检测结果）
     final_df.to_csv('processed_data.csv', index=False)
\ No newline at end of file
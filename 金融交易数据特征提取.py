@@ -1,30 +1,12 @@
-***
+"""
 场景：银行需从交易流水表中提取风险特征。
 任务：
 1.计算每个客户近7天交易次数和单笔最大金额。
 2.单笔交易超过账户余额50%的标记为"高风险"。
-***
-# 测试数据生成
+"""
+import os
 import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
 
-# 生成模拟数据
-np.random.seed(42)
-customer_ids = ['C' + str(i).zfill(4) for i in range(1, 101)]  # 100个客户
-dates = [datetime(2023, 1, 1) + timedelta(days=np.random.randint(0, 30)) for _ in range(1000)]
-
-data = {
-    "交易ID": ["T" + str(i).zfill(6) for i in range(1000)],
-    "客户ID": np.random.choice(customer_ids, 1000),
-    "交易时间": dates,
-    "交易金额": np.round(np.random.uniform(100, 50000, 1000), 2),
-    "账户余额": np.round(np.random.uniform(1000, 200000, 1000), 2)
-}
-
-df = pd.DataFrame(data)
-df.to_csv('transactions.csv', index=False)
-print("测试数据集已生成：transactions.csv")
 
 # 数据特征提取
 class FinancialFeatureExtractor:
@@ -70,6 +52,11 @@ class FinancialFeatureExtractor:
 
 
 if __name__ == "__main__":
+    # 测试数据由 测试数据生成.py 生成（导入本模块不再产生任何文件）
+    if not os.path.exists('transactions.csv'):
+        from 测试数据生成 import generate_transaction_data
+        generate_transaction_data('transactions.csv')
+
     # 使用示例
     processor = FinancialFeatureExtractor('transactions.csv')
     processed_data = processor.add_features()
@@ -66,22 +66,59 @@
 # print("示例数据：")
 # print(df.head(3))
 
+import os
+import pickle
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
 import re
 import chardet
+from 阶段结果缓存 import StageCache, CachedStagesMixin, cached_stage
 
 
-class SurveyCleaner:
-    def __init__(self, file_path):
+class TextMemo:
+    """文本清洗结果的有界LRU缓存（可持久化到磁盘，跨分块、跨运行复用）"""
+
+    def __init__(self, max_size=100000, path=None):
+        self.max_size = max_size
+        self.path = path
+        self._items = OrderedDict()
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    self._items = pickle.load(f)
+            except Exception as e:
+                print(f"文本缓存加载失败：{e}，使用空缓存")
+
+    def get(self, key, default=None):
+        if key in self._items:
+            self._items.move_to_end(key)
+            return self._items[key]
+        return default
+
+    def put(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def save(self):
+        """保存到磁盘（先写临时文件再原子替换）"""
+        if not self.path:
+            return
+        with open(self.path + '.tmp', 'wb') as f:
+            pickle.dump(self._items, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(self.path + '.tmp', self.path)
+
+
+class SurveyCleaner(CachedStagesMixin):
+    def __init__(self, file_path, cache=None, text_memo=None):
         # 自动检测编码
         self.encoding = self._detect_encoding(file_path)
-        # 尝试读取文件（自动回退到utf-8）
-        try:
-            self.df = pd.read_csv(file_path, encoding=self.encoding)
-        except UnicodeDecodeError:
-            print(f"编码 {self.encoding} 解析失败，尝试用 utf-8 重新读取")
-            self.encoding = 'utf-8'
-            self.df = pd.read_csv(file_path, encoding=self.encoding)
+        # 数据在首次使用时读取（缓存命中时无需解析）
+        self._init_stages(file_path, cache)
+        # 文本清洗结果缓存（问卷文本重复度高，只需处理不重复的文本）
+        self.text_memo = text_memo if text_memo is not None else TextMemo()
 
         # 错别字修正规则
         self.typo_correction = {
@@ -97,6 +134,15 @@ class SurveyCleaner:
             "违禁词A", "违禁词B"
         ]
 
+    def _read_df(self):
+        """尝试读取文件（自动回退到utf-8）"""
+        try:
+            return pd.read_csv(self.file_path, encoding=self.encoding)
+        except UnicodeDecodeError:
+            print(f"编码 {self.encoding} 解析失败，尝试用 utf-8 重新读取")
+            self.encoding = 'utf-8'
+            return pd.read_csv(self.file_path, encoding=self.encoding)
+
     def _detect_encoding(self, file_path, sample_size=10000):
         """自动检测文件编码（优先gbk）"""
         try:
@@ -116,19 +162,45 @@ class SurveyCleaner:
             print(f"编码检测失败：{e}，默认使用utf-8")
             return 'utf-8'
 
+    def _transform_unique(self, rule_key, transform):
+        """只对不重复的文本执行转换，再按编码映射回每一行
+
+        rule_key标识转换规则，与文本一起作为缓存键；缓存未命中的文本
+        一次性交给transform（输入输出均为Series）处理。
+        """
+        column = self.df['意见反馈']
+        codes, uniques = pd.factorize(column)
+        missing = object()
+        results = [self.text_memo.get((rule_key, text), missing) for text in uniques]
+        todo = [i for i, value in enumerate(results) if value is missing]
+        if todo:
+            cleaned = transform(pd.Series([uniques[i] for i in todo], dtype=column.dtype))
+            for i, value in zip(todo, cleaned):
+                results[i] = value
+                self.text_memo.put((rule_key, uniques[i]), value)
+        # 编码-1（缺失值）映射到末尾的NaN
+        mapped = np.array(results + [np.nan], dtype=object)[codes]
+        self.df['意见反馈'] = pd.Series(mapped, index=self.df.index, dtype=column.dtype)
+
+    @cached_stage(state=('df', 'encoding'), rules=('typo_correction',))
     def fix_typos(self):
         """修正常见错别字（正则表达式匹配）"""
-        for pattern, replacement in self.typo_correction.items():
-            self.df['意见反馈'] = self.df['意见反馈'].str.replace(
-                pattern, replacement, regex=True
-            )
+
+        def _fix(texts):
+            for pattern, replacement in self.typo_correction.items():
+                texts = texts.str.replace(pattern, replacement, regex=True)
+            return texts
+
+        self._transform_unique(('fix_typos', tuple(self.typo_correction.items())), _fix)
         return self.df
 
+    @cached_stage(state=('df', 'encoding'), rules=('sensitive_words',))
     def filter_sensitive(self, replace_with="[已过滤]"):
         """替换敏感词（不区分大小写）"""
         pattern = '|'.join(map(re.escape, self.sensitive_words))
-        self.df['意见反馈'] = self.df['意见反馈'].str.replace(
-            pattern, replace_with, regex=True, flags=re.IGNORECASE
+        self._transform_unique(
+            ('filter_sensitive', pattern, replace_with),
+            lambda texts: texts.str.replace(pattern, replace_with, regex=True, flags=re.IGNORECASE)
         )
         return self.df
 
@@ -142,11 +214,13 @@ class SurveyCleaner:
 if __name__ == "__main__":
     try:
         # 实例化清洗器
-        cleaner = SurveyCleaner('survey_data.csv')
+        text_memo = TextMemo(path='survey_text_memo.pkl')
+        cleaner = SurveyCleaner('survey_data.csv', cache=StageCache(), text_memo=text_memo)
 
         # 执行清洗步骤
         cleaner.fix_typos()  # 确保此方法存在
         cleaner.filter_sensitive()
+        text_memo.save()
 
         # 保存结果
         cleaner.save_results('cleaned_survey_data.csv')
@@ -0,0 +1,166 @@
+import os
+import json
+import pickle
+import hashlib
+import inspect
+import functools
+
+
+class StageCache:
+    """按内容寻址的阶段结果缓存（本地磁盘 + LRU/容量淘汰）
+
+    缓存键 = 输入文件内容哈希 + 类名 + 规则版本 + 已执行的阶段链（阶段名及参数），
+    结果以pickle二进制格式存放在缓存目录中，命中时直接恢复，跳过解析和计算。
+    """
+
+    def __init__(self, cache_dir='.stage_cache', max_bytes=2 * 1024 ** 3, max_entries=1000):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._file_hashes = {}  # (路径, 大小, 修改时间) → 内容哈希
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def file_hash(self, file_path, block_size=1024 * 1024):
+        """计算文件内容哈希（文件未变化时复用上次结果）"""
+        stat = os.stat(file_path)
+        memo_key = (os.path.realpath(file_path), stat.st_size, stat.st_mtime_ns)
+        if memo_key not in self._file_hashes:
+            digest = hashlib.sha256()
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(block_size), b''):
+                    digest.update(block)
+            self._file_hashes[memo_key] = digest.hexdigest()
+        return self._file_hashes[memo_key]
+
+    def make_key(self, file_path, namespace, version, stages):
+        """生成缓存键"""
+        payload = json.dumps(
+            [self.file_hash(file_path), namespace, version, stages],
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + '.pkl')
+
+    def get(self, key):
+        """读取缓存，未命中或缓存损坏时返回None"""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"缓存读取失败：{e}，重新计算")
+            self._remove(path)
+            return None
+        os.utime(path)  # 更新访问时间，用于LRU淘汰
+        return entry
+
+    def put(self, key, entry):
+        """写入缓存（先写临时文件再原子替换），并按需淘汰旧条目"""
+        path = self._entry_path(key)
+        tmp_path = path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"缓存写入失败：{e}")
+            self._remove(tmp_path)
+            return
+        self._evict()
+
+    def _evict(self):
+        """超过容量或条目数上限时，按最近使用时间淘汰最旧的条目"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.pkl'):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        while entries and (total > self.max_bytes or len(entries) > self.max_entries):
+            _, size, name = entries.pop(0)
+            self._remove(os.path.join(self.cache_dir, name))
+            total -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class CachedStagesMixin:
+    """为分析类提供延迟读取的df和阶段缓存
+
+    子类需实现 _read_df()，并在 __init__ 中调用 _init_stages(file_path, cache)。
+    """
+
+    RULES_VERSION = '1'  # 规则变化时递增，使旧缓存失效
+
+    def _init_stages(self, file_path, cache=None):
+        self.file_path = file_path
+        self.cache = cache
+        self._df = None
+        self._stages = []  # 已执行的阶段链
+
+    @property
+    def df(self):
+        # 首次使用时才读取文件，缓存命中时不需要解析
+        if self._df is None:
+            self._df = self._read_df()
+        return self._df
+
+    @df.setter
+    def df(self, value):
+        self._df = value
+
+
+def cached_stage(state=('df',), rules=()):
+    """阶段缓存装饰器
+
+    state：阶段执行后需要保存/恢复的属性；
+    rules：规则属性（如错别字表），其内容参与缓存键，规则变化时自动失效。
+    """
+
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            params = {k: v for k, v in bound.arguments.items() if k != 'self'}
+            params.update({name: getattr(self, name) for name in rules})
+            stage = [method.__name__, params]
+
+            # 阶段成功执行或命中缓存后才计入阶段链，抛异常的阶段不影响后续阶段的缓存键
+            if self.cache is None:
+                result = method(self, *args, **kwargs)
+                self._stages.append(stage)
+                return result
+
+            key = self.cache.make_key(
+                self.file_path, type(self).__name__, self.RULES_VERSION, self._stages + [stage]
+            )
+            entry = self.cache.get(key)
+            if entry is not None:
+                for name, value in entry['state'].items():
+                    setattr(self, name, value)
+                self._stages.append(stage)
+                return self.df if entry['returns_df'] else None
+
+            result = method(self, *args, **kwargs)
+            self._stages.append(stage)
+            self.cache.put(key, {
+                'state': {name: getattr(self, name) for name in state},
+                'returns_df': result is not None and result is self._df,
+            })
+            return result
+
+        return wrapper
+
+    return decorator